@@ -0,0 +1,47 @@
+'''
+Compare the serial loop with the thread and process batch backends.
+
+    python benchmarks/batch_bench.py [inputs] [workers]
+'''
+import os
+import sys
+import time
+
+from simple_rules.process import Rule
+from simple_rules.regex import RegexMatch
+
+
+SYMBOLS = {
+    'ip': r'.*\b\d{1,3}(?:\.\d{1,3}){3}\b',
+    'error': r'.*\b(?:error|fail(?:ed|ure)?)\b',
+    'user': r'.*user=\w+',
+    'path': r'.*(?:/[\w.-]+){3,}',
+}
+RULE = '(ip AND error) OR (user AND path)'
+LINES = [
+    'GET /static/img/logo.png 200 10.0.0.1',
+    'user=alice opened /home/alice/docs/report.txt',
+    'connection from 192.168.1.20 failed: timeout',
+    'heartbeat ok',
+]
+
+
+def timed(label, fn, count):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print("{:<8} {:>10.0f} inputs/s".format(label, count / elapsed))
+
+
+def main(count=200000, workers=os.cpu_count()):
+    sym_maps = {name: RegexMatch(name, pattern) for name, pattern in SYMBOLS.items()}
+    rule = Rule.from_token_string('bench', RULE, sym_maps)
+    inputs = [LINES[i % len(LINES)] for i in range(count)]
+
+    timed('serial', lambda: [rule.evaluate(i) for i in inputs], count)
+    for backend in ['thread', 'process']:
+        timed(backend, lambda: list(rule.execute_many(inputs, workers=workers, backend=backend)), count)
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:3]])
@@ -0,0 +1,36 @@
+'''
+Compare interpreted and compiled rule execution throughput.
+
+    python benchmarks/compile_bench.py [iterations]
+'''
+import sys
+import timeit
+
+from simple_rules.process import Rule
+from simple_rules.regex import RegexMatch
+
+
+SYMBOLS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot']
+RULE = 'alpha OR (bravo AND charlie) OR (delta AND (echo OR foxtrot))'
+INPUTS = ['alpha', 'bravo charlie', 'delta foxtrot', 'golf', 'hotel india']
+
+
+def main(iterations=20000):
+    sym_maps = {name: RegexMatch(name, name) for name in SYMBOLS}
+    rule = Rule.from_token_string('bench', RULE, sym_maps)
+    rule.compile()
+
+    def run(fn):
+        for i in INPUTS:
+            fn(i)
+
+    interpreted = timeit.timeit(lambda: run(rule.interpret), number=iterations)
+    compiled = timeit.timeit(lambda: run(rule.execute), number=iterations)
+    total = iterations * len(INPUTS)
+    print("interpreted: {:.0f} inputs/s".format(total / interpreted))
+    print("compiled:    {:.0f} inputs/s".format(total / compiled))
+    print("speedup:     {:.2f}x".format(interpreted / compiled))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:2]])
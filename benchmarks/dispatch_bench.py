@@ -0,0 +1,34 @@
+'''
+Per call overhead of ActionBaseClass.match dispatch.
+
+    python benchmarks/dispatch_bench.py [iterations]
+'''
+import sys
+import timeit
+
+from simple_rules.actions import ActionBaseClass
+
+
+class Text(str):
+    pass
+
+
+class Record(object):
+    pass
+
+
+def main(iterations=1000000):
+    action = ActionBaseClass()
+    transform = lambda obj: True
+    action.register_class(str, transform)
+    action.register_class(object, transform)
+
+    baseline = timeit.timeit(lambda: transform('x'), number=iterations)
+    print("{:<16} {:>8.1f} ns/call".format('direct call', baseline / iterations * 1e9))
+    for label, obj in [('str', 'x'), ('str subclass', Text('x')), ('object subclass', Record())]:
+        elapsed = timeit.timeit(lambda: action.match(obj), number=iterations)
+        print("{:<16} {:>8.1f} ns/call dispatch overhead".format(label, (elapsed - baseline) / iterations * 1e9))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:2]])
@@ -0,0 +1,55 @@
+'''
+Seeded generators of synthetic symbol tables, rule strings and input
+corpora for the benchmark suite.
+'''
+import string
+
+OPERATORS = ['AND', 'OR']
+
+
+def make_words(count, rng, min_len=4, max_len=10):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_len, max_len))))
+    return sorted(words)
+
+
+def make_symbols(count, rng):
+    '''
+    :return: dict of symbol name to regular expression, each matching a word anywhere in a line
+    '''
+    words = make_words(count, rng)
+    return {'sym_{}'.format(pos): r'.*\b{}\b'.format(word) for pos, word in enumerate(words)}
+
+
+def make_rule_string(names, size, depth, rng):
+    '''
+    :param names: symbol names to draw from
+    :param size: operands per group
+    :param depth: nesting depth of groups
+    :return: rule string
+    '''
+    operands = []
+    for _ in range(size):
+        if depth > 0 and rng.random() < 0.5:
+            operands.append('( {} )'.format(make_rule_string(names, size, depth - 1, rng)))
+        else:
+            operands.append(rng.choice(names))
+    parts = [operands[0]]
+    for operand in operands[1:]:
+        parts += [rng.choice(OPERATORS), operand]
+    return " ".join(parts)
+
+
+def make_corpus(symbols, count, rng, words_per_line=12, hit_rate=0.3):
+    '''
+    :return: list of input lines, roughly hit_rate of the words come from the symbols
+    '''
+    symbol_words = [pattern[len(r'.*\b'):-len(r'\b')] for pattern in symbols.values()]
+    noise = make_words(200, rng)
+    lines = []
+    for _ in range(count):
+        line = [rng.choice(symbol_words) if rng.random() < hit_rate else rng.choice(noise)
+                for _ in range(words_per_line)]
+        lines.append(" ".join(line))
+    return lines
@@ -0,0 +1,156 @@
+'''
+Reproducible benchmark suite for parsing, validation, rule execution and
+similarity functions.  Results are written as JSON and can be compared
+with a saved baseline.
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --baseline results.json --threshold 0.1
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+
+import regex
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generators import make_corpus, make_rule_string, make_symbols, make_words
+from simple_rules.consts import VERSION
+from simple_rules.parser import Parser
+from simple_rules.process import Rule
+from simple_rules.regex import RegexMatch
+from simple_rules.ruleset import RuleSet
+from simple_rules.validate import TokenStreamValidator
+from simple_rules.vectors import BaseVectorOp
+
+
+def build_cases(args):
+    rng = random.Random(args.seed)
+    symbols = make_symbols(args.symbols, rng)
+    names = sorted(symbols)
+    sym_maps = {name: RegexMatch(name, pattern) for name, pattern in symbols.items()}
+    rule_string = make_rule_string(names, args.rule_size, args.rule_depth, rng)
+    tokens = Parser.parse_string(rule_string)
+    rule = Rule.from_token_string('bench', rule_string, sym_maps)
+    corpus = make_corpus(symbols, args.corpus, rng)
+    words = make_words(args.words, rng)
+    target = words[0]
+    ruleset = RuleSet(symbols)
+    compiled = [regex.compile(pattern) for pattern in symbols.values()]
+
+    def execute():
+        for line in corpus:
+            rule.execute(line)
+
+    def interpret():
+        for line in corpus:
+            rule.interpret(line)
+
+    def match_symbols():
+        for line in corpus:
+            ruleset.match_symbols(line)
+
+    def separate_regex():
+        for line in corpus:
+            for rx in compiled:
+                rx.match(line)
+
+    def pairwise(fn):
+        def run():
+            for word in words:
+                fn(word, target)
+        return run
+
+    # name -> (callable, operations per call)
+    return {
+        'parse_string': (lambda: Parser.parse_string(rule_string), 1),
+        'validate_without_symbols': (lambda: TokenStreamValidator(tokens).validate_without_symbols(), 1),
+        'rule_from_token_string': (lambda: Rule.from_token_string('bench', rule_string, sym_maps), 1),
+        'rule_execute': (execute, len(corpus)),
+        'rule_interpret': (interpret, len(corpus)),
+        'ruleset_match_symbols': (match_symbols, len(corpus)),
+        'separate_regex_match': (separate_regex, len(corpus)),
+        'cosine_similarity_from_string': (pairwise(BaseVectorOp.cosine_similarity_from_string), len(words)),
+        'jaccard_distance': (pairwise(BaseVectorOp.jaccard_distance), len(words)),
+        'levenshtein_similarity': (pairwise(BaseVectorOp.levenshtein_similarity), len(words)),
+        'jaro_winkler_distance': (pairwise(BaseVectorOp.jaro_winkler_distance), len(words)),
+        'cosine_similarity_matrix': (lambda: BaseVectorOp.cosine_similarity_matrix(words, words[:50]), len(words) * 50),
+    }
+
+
+def run(cases, repeat, min_time):
+    results = {}
+    for name, (fn, ops) in cases.items():
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        number = max(number, int(number * min_time / 0.2))
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        results[name] = {'seconds_per_op': best / ops, 'ops_per_second': ops / best}
+    return results
+
+
+def compare(results, baseline):
+    '''
+    :return: list of (name, ratio) where ratio is current over baseline time
+    '''
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        rows.append((name, result['seconds_per_op'] / baseline[name]['seconds_per_op']))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--symbols', type=int, default=200, help='symbol table size')
+    parser.add_argument('--rule-size', type=int, default=4, help='operands per group')
+    parser.add_argument('--rule-depth', type=int, default=3, help='group nesting depth')
+    parser.add_argument('--corpus', type=int, default=200, help='input lines')
+    parser.add_argument('--words', type=int, default=500, help='words for the similarity functions')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per timing repeat')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(build_cases(args), args.repeat, args.min_time)
+    report = {
+        'meta': {
+            'version': VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'threshold')},
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta']['params'] != report['meta']['params']:
+            print("warning: baseline was recorded with different parameters")
+        rows = compare(results, baseline['results'])
+        for name, ratio in rows:
+            status = 'REGRESSION' if ratio > 1 + args.threshold else 'faster' if ratio < 1 - args.threshold else 'ok'
+            print("{:<32} {:>8.3f}x  {}".format(name, ratio, status))
+            if status == 'REGRESSION':
+                regressions.append(name)
+    else:
+        for name, result in results.items():
+            print("{:<32} {:>14.1f} ops/s".format(name, result['ops_per_second']))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+'''
+Matching a symbol table against input lines: RuleSet.match_symbols against
+a loop of separate regex matches and a single regex of one lookahead per
+symbol.
+
+    python benchmarks/symbol_bench.py [symbols] [lines]
+'''
+import os
+import random
+import sys
+import timeit
+
+import regex
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generators import make_corpus, make_symbols
+from simple_rules.regex import RegexMatch
+from simple_rules.ruleset import RuleSet
+
+
+def main(symbol_count=200, line_count=200, seed=1):
+    rng = random.Random(seed)
+    symbols = make_symbols(symbol_count, rng)
+    corpus = make_corpus(symbols, line_count, rng)
+
+    compiled = [regex.compile(pattern) for pattern in symbols.values()]
+    actions = [RegexMatch(name, pattern) for name, pattern in symbols.items()]
+    lookaheads = regex.compile("".join('(?=(?P<_sr{}>{}))?'.format(pos, pattern)
+                                       for pos, pattern in enumerate(symbols.values())))
+    ruleset = RuleSet(symbols)
+    prefiltered = RuleSet(symbols, prefilter=True)
+
+    def separate_regex():
+        for line in corpus:
+            for rx in compiled:
+                rx.match(line)
+
+    def separate_actions():
+        for line in corpus:
+            for action in actions:
+                action.match(line)
+
+    def lookahead_regex():
+        for line in corpus:
+            lookaheads.match(line)
+
+    cases = [
+        ('separate regex.match', separate_regex),
+        ('separate RegexMatch.match', separate_actions),
+        ('one lookahead regex', lookahead_regex),
+        ('RuleSet.match_symbols', lambda: [ruleset.match_symbols(line) for line in corpus]),
+        ('RuleSet prefilter', lambda: [prefiltered.match_symbols(line) for line in corpus]),
+    ]
+    baseline = None
+    for label, fn in cases:
+        elapsed = min(timeit.repeat(fn, number=1, repeat=5))
+        baseline = baseline if baseline is not None else elapsed
+        print("{:<28} {:>8.4f}s  {:>6.2f}x vs separate regex".format(label, elapsed, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:3]])
@@ -12,7 +12,16 @@ setup(name='simple-rules',
       description='Library for implement simple rule matching',
       author='Adam Pridgen',
       author_email='adam.pridgen.phd@gmail.com',
-      install_requires=['toml', 'wheel', 'regex', 'jellyfish'],
+      install_requires=['toml', 'wheel', 'regex', 'jellyfish', 'numpy'],
+      extras_require={
+          # single pass multi-literal scan for RuleSet(prefilter=True)
+          'prefilter': ['pyahocorasick'],
+      },
       packages=find_packages('src'),
       package_dir={'': 'src'},
+      entry_points={
+          'console_scripts': [
+              'simple-rules-scan=simple_rules.scan:main',
+          ],
+      },
 )
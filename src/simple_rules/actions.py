@@ -1,24 +1,178 @@
 from .consts import *
+from bisect import bisect_left
 import regex
+import time
+
+
+class ActionProfile(object):
+    '''
+    Latency and outcome counts for one action (or rule), collected while
+    profiling.  Latencies are also counted in LATENCY_BUCKETS, the upper
+    bounds in seconds of a histogram, with a final overflow bucket.
+    '''
+    LATENCY_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 1.0)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.true_count = 0
+        self.total_time = 0.0
+        self.buckets = [0] * (len(self.LATENCY_BUCKETS) + 1)
+
+    def observe(self, elapsed, result):
+        self.total_time += elapsed
+        self.buckets[bisect_left(self.LATENCY_BUCKETS, elapsed)] += 1
+        self.calls += 1
+        if result:
+            self.true_count += 1
+
+    def record(self, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.observe(time.perf_counter() - start, result)
+        return result
+
+    @property
+    def false_count(self):
+        return self.calls - self.true_count
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.calls if self.calls else 0.0
+
+    @property
+    def true_rate(self):
+        return self.true_count / self.calls if self.calls else 0.0
+
 
 class ActionBaseClass(object):
     TYPE = ACTION
+    # actions whose result only depends on the input may be reordered
+    SIDE_EFFECT_FREE = False
 
     def __init__(self):
         self.match_mapping = {}
+        # type -> resolved transform, filled on first use of each type
+        self.dispatch_cache = {}
+        # reorder profiling, see enable_profiling
+        self.profile = None
+        # metrics.RuleMetrics profile while any attached rule uses this action
+        self.metrics_profile = None
+
+    def enable_profiling(self):
+        if self.profile is None:
+            self.profile = ActionProfile()
+        return self.profile
+
+    def disable_profiling(self):
+        self.profile = None
 
     def register_class(self, klass, transform):
         self.match_mapping[klass] = transform
+        self.dispatch_cache.clear()
+
+    def resolve(self, typ):
+        '''
+        Find the transform for a type like functools.singledispatch: the
+        closest registered class in its MRO, then the most specific
+        registered abstract class (e.g. Mapping before Iterable), then a
+        registered object, otherwise match_default.  The result is cached
+        per type.
+        '''
+        transform = None
+        for klass in typ.__mro__[:-1]:
+            if klass in self.match_mapping:
+                transform = self.match_mapping[klass]
+                break
+        if transform is None:
+            candidates = [klass for klass in self.match_mapping if klass is not object and issubclass(typ, klass)]
+            # drop the candidates another candidate is more specific than
+            best = [klass for klass in candidates
+                    if not any(other is not klass and issubclass(other, klass) for other in candidates)]
+            if len(best) > 1:
+                raise Exception("Ambiguous dispatch for {}: {}".format(typ, best))
+            if len(best) == 1:
+                transform = self.match_mapping[best[0]]
+        if transform is None:
+            transform = self.match_mapping.get(object, self.match_default)
+        self.dispatch_cache[typ] = transform
+        return transform
 
-    def execute(self, obj):
-        return self.match(obj)
+    def execute(self, obj, state=None):
+        if isinstance(state, EvaluationContext):
+            return state.execute(self, obj)
+        return self.run(obj)
+
+    def run(self, obj):
+        if self.profile is None and self.metrics_profile is None:
+            return self.match(obj)
+        start = time.perf_counter()
+        result = self.match(obj)
+        elapsed = time.perf_counter() - start
+        for profile in (self.profile, self.metrics_profile):
+            if profile is not None:
+                profile.observe(elapsed, result)
+        return result
 
     def match(self, obj):
-        typ = type(obj)
-        if typ in self.match_mapping:
-            return self.match_mapping[typ](obj)
-        return self.match_default(obj)
+        try:
+            transform = self.dispatch_cache[type(obj)]
+        except KeyError:
+            transform = self.resolve(type(obj))
+        return transform(obj)
 
     def match_default(self, obj):
         return False
 
+
+class EvaluationContext(object):
+    '''
+    Passed as the state of Rule.execute, caches each action's result for the
+    current input so an action shared by many rules or groups runs once,
+    and likewise the result of each interned group shared by several rules.
+    A new input (by identity) clears the cached results.  The same object
+    changed in place, e.g. a reused bytearray buffer or record, is not a new
+    input: call reset(input) before evaluating it again, or use a new
+    context per input.
+    '''
+
+    def __init__(self):
+        self.input = None
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self, input=None):
+        '''
+        Start a new input, dropping the cached results.
+        '''
+        self.input = input
+        self.results = {}
+
+    def execute(self, action, obj):
+        if obj is not self.input:
+            self.reset(obj)
+        if action in self.results:
+            self.hits += 1
+            return self.results[action]
+        self.misses += 1
+        result = action.run(obj)
+        self.results[action] = result
+        return result
+
+    def group(self, group_key, fn, obj):
+        if obj is not self.input:
+            self.reset(obj)
+        key = (PREDICATE, group_key)
+        if key in self.results:
+            self.hits += 1
+            return self.results[key]
+        self.misses += 1
+        result = fn(obj, self)
+        self.results[key] = result
+        return result
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,110 @@
+import asyncio
+from collections import deque
+
+from .consts import *
+
+_END = object()
+
+
+class AsyncRuleEngine(object):
+    '''
+    Evaluates rules over an async stream of inputs without blocking the
+    event loop.  Cheap rules run inline, slow rules run in an executor.  At
+    most `concurrency` inputs are evaluated at once and at most
+    `queue_size` inputs are read ahead of evaluation, so a slow consumer
+    pushes back on the producer.
+    '''
+
+    def __init__(self, rules, executor=None, concurrency=8, queue_size=100, slow_rules=None, slow_threshold=None):
+        '''
+        :param rules: list of process.Rule
+        :param executor: concurrent.futures executor, None uses the loop default
+        :param concurrency: inputs evaluated at the same time
+        :param queue_size: inputs buffered ahead of evaluation
+        :param slow_rules: names of rules that are always offloaded
+        :param slow_threshold: offload rules with a profiled action slower than
+        this many seconds per call
+        '''
+        self.rules = list(rules)
+        self.executor = executor
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.slow_rules = set(slow_rules) if slow_rules is not None else set()
+        self.slow_threshold = slow_threshold
+        self.inline_rules = []
+        self.offload_rules = []
+        self.classify()
+
+    def is_slow(self, rule):
+        if rule.name in self.slow_rules:
+            return True
+        if self.slow_threshold is None:
+            return False
+        for action in rule.actions():
+            profile = getattr(action, 'profile', None)
+            if profile is not None and profile.calls > 0 and profile.mean_time >= self.slow_threshold:
+                return True
+        return False
+
+    def classify(self):
+        '''
+        Split the rules into inline and offloaded rules, call again after
+        profiling data changes.
+        '''
+        self.inline_rules = [rule for rule in self.rules if not self.is_slow(rule)]
+        self.offload_rules = [rule for rule in self.rules if self.is_slow(rule)]
+        for rule in self.rules:
+            rule.compile()
+
+    @classmethod
+    def execute_rules(cls, rules, input):
+        return set(rule.name for rule in rules if rule.execute(input))
+
+    async def evaluate(self, input):
+        '''
+        :return: names of the rules that match the input, in rule order
+        '''
+        matched = self.execute_rules(self.inline_rules, input)
+        if len(self.offload_rules) > 0:
+            loop = asyncio.get_running_loop()
+            matched |= await loop.run_in_executor(self.executor, self.execute_rules, self.offload_rules, input)
+        return [rule.name for rule in self.rules if rule.name in matched]
+
+    async def _read(self, inputs, queue):
+        try:
+            async for input in inputs:
+                await queue.put(input)
+        except Exception as e:
+            await queue.put((_END, e))
+            return
+        await queue.put((_END, None))
+
+    async def stream(self, inputs):
+        '''
+        :param inputs: async iterator of inputs
+        :return: async generator of (input, matched rule names) in input order
+        '''
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        reader = asyncio.ensure_future(self._read(inputs, queue))
+        pending = deque()
+        error = None
+        try:
+            while True:
+                item = await queue.get()
+                if isinstance(item, tuple) and len(item) == 2 and item[0] is _END:
+                    error = item[1]
+                    break
+                pending.append((item, asyncio.ensure_future(self.evaluate(item))))
+                if len(pending) >= self.concurrency:
+                    input, task = pending.popleft()
+                    yield input, await task
+
+            while len(pending) > 0:
+                input, task = pending.popleft()
+                yield input, await task
+            if error is not None:
+                raise error
+        finally:
+            reader.cancel()
+            for _, task in pending:
+                task.cancel()
@@ -0,0 +1,129 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+import os
+
+THREAD_BACKEND = 'thread'
+PROCESS_BACKEND = 'process'
+BACKENDS = [THREAD_BACKEND, PROCESS_BACKEND]
+
+# engine installed in each worker process by init_worker
+_WORKER_ENGINE = None
+
+
+def init_worker(engine):
+    '''
+    Process pool initializer, the engine arrives pickled (or inherited on
+    fork) and is compiled once for the lifetime of the worker.
+    '''
+    global _WORKER_ENGINE
+    engine.compile()
+    _WORKER_ENGINE = engine
+
+
+def worker_engine():
+    return _WORKER_ENGINE
+
+
+def evaluate_chunk(chunk, engine=None):
+    engine = engine if engine is not None else _WORKER_ENGINE
+    evaluate = engine.evaluate
+    return [evaluate(i) for i in chunk]
+
+
+def evaluate_chunk_stats(chunk):
+    '''
+    evaluate_chunk for engines that keep counters: the worker's counters
+    for the chunk are handed back with the results, see execute_many
+    '''
+    results = evaluate_chunk(chunk)
+    return results, _WORKER_ENGINE.take_stats()
+
+
+def chunked(iterable, chunk_size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def execute_many(engine, inputs, workers=None, backend=PROCESS_BACKEND, chunk_size=1000, ordered=True):
+    '''
+    Evaluate an engine (Rule or RuleSet) over many inputs.
+
+    :param engine: object with compile() and evaluate(input).  With the
+    process backend, an engine that also has take_stats() and
+    merge_stats(stats) gets the counters of its worker copies merged in.
+    :param inputs: iterable of inputs, consumed lazily
+    :param workers: number of workers, 1 evaluates serially in this thread
+    :param backend: 'process' or 'thread'
+    :param chunk_size: inputs handed to a worker at a time
+    :param ordered: yield results in input order, otherwise yield
+    (position, result) pairs as soon as their chunk completes
+    :return: generator of results
+    '''
+    if backend not in BACKENDS:
+        raise Exception("Unknown backend {}, expected one of: {}".format(backend, BACKENDS))
+    workers = workers if workers is not None else os.cpu_count() or 1
+
+    if workers == 1:
+        engine.compile()
+        evaluate = engine.evaluate
+        for pos, input in enumerate(inputs):
+            yield evaluate(input) if ordered else (pos, evaluate(input))
+        return
+
+    results = lambda future: future.result()
+    if backend == PROCESS_BACKEND:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(engine,))
+        submit = lambda chunk: executor.submit(evaluate_chunk, chunk)
+        if hasattr(engine, 'merge_stats'):
+            submit = lambda chunk: executor.submit(evaluate_chunk_stats, chunk)
+            results = lambda future: _merged(engine, future)
+    else:
+        engine.compile()
+        executor = ThreadPoolExecutor(max_workers=workers)
+        submit = lambda chunk: executor.submit(evaluate_chunk, chunk, engine)
+
+    # bound the chunks in flight so huge inputs are not read up front
+    max_pending = workers * 2
+    with executor:
+        pending = deque()
+        chunks = enumerate(chunked(inputs, chunk_size))
+        for num, chunk in chunks:
+            pending.append((num * chunk_size, submit(chunk)))
+            if len(pending) < max_pending:
+                continue
+            if ordered:
+                _, future = pending.popleft()
+                for result in results(future):
+                    yield result
+            else:
+                for item in _completed(pending, results):
+                    yield item
+
+        while len(pending) > 0:
+            if ordered:
+                _, future = pending.popleft()
+                for result in results(future):
+                    yield result
+            else:
+                for item in _completed(pending, results):
+                    yield item
+
+
+def _merged(engine, future):
+    results, stats = future.result()
+    engine.merge_stats(stats)
+    return results
+
+
+def _completed(pending, results):
+    done, _ = wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+    for item in [item for item in pending if item[1] in done]:
+        pending.remove(item)
+        start, future = item
+        for pos, result in enumerate(results(future)):
+            yield start + pos, result
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import sys
+
+from .consts import *
+from .config import Config
+from .parser import AND_OPERATOR, OR_OPERATOR
+from .process import Rule
+from .regex import RegexMatch
+from .validate import Predicate
+
+
+class CompiledRuleCache(object):
+    '''
+    Stores the validated predicate groups of every configured rule, keyed
+    by a hash of the TOML content and the library version, so a warm start
+    skips TOML parsing, tokenizing and validation.  The cache is plain JSON,
+    loading a cache file never runs code from it.
+    '''
+    SUFFIX = '.rules-cache'
+
+    def __init__(self, config_path, cache_dir=None):
+        self.config_path = config_path
+        self.cache_dir = cache_dir
+
+    @property
+    def cache_path(self):
+        name = os.path.basename(self.config_path) + self.SUFFIX
+        directory = self.cache_dir if self.cache_dir is not None else os.path.dirname(os.path.abspath(self.config_path))
+        return os.path.join(directory, name)
+
+    @classmethod
+    def content_key(cls, data):
+        digest = hashlib.sha256()
+        digest.update(VERSION.encode('utf8'))
+        digest.update(sys.version.encode('utf8'))
+        digest.update(data)
+        return digest.hexdigest()
+
+    @classmethod
+    def encode_rule(cls, rule):
+        groups = {}
+        for num, members in rule.predicates.items():
+            encoded = []
+            for node in members:
+                if node.TYPE == ACTION:
+                    encoded.append((SYMBOL, node.name))
+                elif node.TYPE == PREDICATE:
+                    encoded.append((PREDICATE, node.num))
+                else:
+                    encoded.append((node.TYPE,))
+            groups[num] = encoded
+        # JSON object keys are strings, keep the group numbers as pairs
+        return rule.main_predicate, sorted(groups.items())
+
+    @classmethod
+    def decode_rule(cls, name, encoded, sym_maps):
+        main_predicate, groups = encoded
+        ast = {}
+        for num, members in groups:
+            ast[num] = []
+            for member in members:
+                if member[0] == SYMBOL:
+                    ast[num].append(sym_maps[member[1]])
+                elif member[0] == PREDICATE:
+                    ast[num].append(Predicate(member[1]))
+                elif member[0] == AND:
+                    ast[num].append(AND_OPERATOR)
+                else:
+                    ast[num].append(OR_OPERATOR)
+        return Rule.from_groups(name, ast, main_predicate)
+
+    def load(self, key):
+        '''
+        :return: (config data, encoded chains) or None when missing or stale
+        '''
+        try:
+            with open(self.cache_path, 'r', encoding='utf8') as cache_file:
+                cached = json.load(cache_file)
+            cached_key, config_data, encoded_chains = cached['key'], cached['config'], cached['chains']
+        except Exception:
+            return None
+        if cached_key != key or not isinstance(config_data, dict) or not isinstance(encoded_chains, dict):
+            return None
+        return config_data, encoded_chains
+
+    def save(self, key, config_data, chains):
+        encoded_chains = {chain: {name: self.encode_rule(rule) for name, rule in rules.items()}
+                          for chain, rules in chains.items()}
+        tmp_path = "{}.{}.tmp".format(self.cache_path, os.getpid())
+        try:
+            with open(tmp_path, 'w', encoding='utf8') as cache_file:
+                json.dump({'key': key, 'config': config_data, 'chains': encoded_chains}, cache_file)
+            os.replace(tmp_path, self.cache_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def build_sym_maps(cls, config_data):
+        return {name: RegexMatch.from_config(name, spec) for name, spec in config_data.get(REGEX_RULES, {}).items()}
+
+    @classmethod
+    def build_rules(cls, config_data, chain, sym_maps):
+        rules = {}
+        for name, rule_string in config_data.get(chain, {}).items():
+            rule = Rule.from_token_string(name, rule_string, sym_maps)
+            if rule is None:
+                raise Exception("Rule {} references unknown symbols: {}".format(name, rule_string))
+            rules[name] = rule
+        return rules
+
+    def load_chains(self):
+        '''
+        Load Config and the rules of every chain, from the cache when it
+        matches the config content, otherwise from the TOML (refreshing the
+        cache).
+
+        :return: dict of chain name to dict of rule name to Rule
+        '''
+        with open(self.config_path, 'rb') as config_file:
+            key = self.content_key(config_file.read())
+
+        cached = self.load(key)
+        if cached is not None:
+            config_data, encoded_chains = cached
+            try:
+                sym_maps = self.build_sym_maps(config_data)
+                chains = {chain: {name: self.decode_rule(name, encoded, sym_maps) for name, encoded in rules.items()}
+                          for chain, rules in encoded_chains.items()}
+            except Exception:
+                # malformed cache, rebuild it from the TOML
+                chains = None
+            if chains is not None:
+                Config.CONFIG.update(config_data)
+                return chains
+
+        Config.parse_config(self.config_path)
+        config_data = {k: dict(v) for k, v in Config.CONFIG.items()}
+        sym_maps = self.build_sym_maps(config_data)
+        chains = {chain: self.build_rules(config_data, chain, sym_maps) for chain in [IGNORE_CHAIN, MATCH_CHAIN]}
+        try:
+            self.save(key, config_data, chains)
+        except (OSError, TypeError, ValueError):
+            # read only location or values JSON can not hold, run without the cache
+            pass
+        return chains
+
+    def load_rules(self, chain=MATCH_CHAIN):
+        '''
+        :return: dict of rule name to Rule for one chain
+        '''
+        return self.load_chains()[chain]
@@ -6,17 +6,37 @@ class Config(object):
     CONFIG = {}
 
     @classmethod
-    def from_json(cls, json_data):
+    def read_json(cls, json_data):
+        '''
+        :return: the config blocks of the parsed TOML, without touching CONFIG
+        '''
+        config = {}
         download_finder = json_data.get(SIMPLE_RULES_BLOCK, {})
         # parse ignore rules
-        cls.CONFIG[IGNORE_REGEX_RULES] = {}
+        config[IGNORE_REGEX_RULES] = {}
         for name, regex in download_finder.get(IGNORE_REGEX_RULES, {}).items():
-            cls.CONFIG[IGNORE_REGEX_RULES][name] = regex
+            config[IGNORE_REGEX_RULES][name] = regex
 
         # parse regex rule
-        cls.CONFIG[REGEX_RULES] = {}
+        config[REGEX_RULES] = {}
         for name, regex in download_finder.get(REGEX_RULES, {}).items():
-            cls.CONFIG[REGEX_RULES][name] = regex
+            config[REGEX_RULES][name] = regex
+
+        # parse rule chains, rule name to rule string
+        for chain in [IGNORE_CHAIN, MATCH_CHAIN]:
+            config[chain] = {}
+            for name, rule in download_finder.get(chain, {}).items():
+                config[chain][name] = rule
+        return config
+
+    @classmethod
+    def from_json(cls, json_data):
+        cls.CONFIG.update(cls.read_json(json_data))
+
+    @classmethod
+    def read_config(cls, config):
+        with open(config) as config_file:
+            return cls.read_json(toml.load(config_file))
 
     @classmethod
     def parse_config(cls, config):
@@ -36,6 +36,16 @@ ACTION = 'ACTION'
 SIMPLE_RULES_BLOCK = 'simple-rules'
 
 REGEX_BLOCK = 'regular-expressions'
+REGEX_RULES = REGEX_BLOCK
+IGNORE_REGEX_RULES = 'ignore-' + REGEX_BLOCK
+
+# what a symbol's pattern is matched against, see RegexMatch
+TEXT_TARGET = 'text'
+BYTES_TARGET = 'bytes'
+TARGETS = [TEXT_TARGET, BYTES_TARGET]
+ENCODING = 'utf8'
 
 IGNORE_CHAIN = 'ignore-chain'
-MATCH_CHAIN = 'match-chain'
\ No newline at end of file
+MATCH_CHAIN = 'match-chain'
+
+VERSION = '1.0'
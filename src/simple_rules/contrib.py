@@ -1,38 +1,58 @@
-# Wikibooks: Algorithm Implementation/Strings/Levenshtein distance
-# https://en.wikibooks.org/wiki/Algorithm_Implementation/Strings/Levenshtein_distance#Python
-def levenshtein(source, target):
+# Bit-parallel edit distance
+# G. Myers, "A fast bit-vector algorithm for approximate string matching based
+# on dynamic programming", JACM 1999, in the formulation of H. Hyyrö, "Explaining
+# and extending the bit-parallel approximate string matching algorithm of Myers",
+# 2001.  Python integers are arbitrary precision, so a pattern longer than a
+# machine word is processed as a multi-word bit vector by the interpreter; the
+# carries between words of the block-based version are handled by the integer
+# addition.
+def levenshtein(source, target, max_distance=None):
+    '''
+    :param source: first string
+    :param target: second string
+    :param max_distance: stop as soon as the distance is known to exceed this
+    :return: the edit distance, or max_distance + 1 when it is exceeded
+    '''
     if len(source) < len(target):
-        return levenshtein(target, source)
+        source, target = target, source
 
     # So now we have len(source) >= len(target).
+    if max_distance is not None and len(source) - len(target) > max_distance:
+        return max_distance + 1
     if len(target) == 0:
         return len(source)
 
-    # We call tuple() to force strings to be used as sequences
-    # ('c', 'a', 't', 's') - numpy uses them as values by default.
-    source = np.array(tuple(source))
-    target = np.array(tuple(target))
+    # bit i of peq[c] is set when target[i] == c
+    peq = {}
+    bit = 1
+    for c in target:
+        peq[c] = peq.get(c, 0) | bit
+        bit <<= 1
 
-    # We use a dynamic programming algorithm, but with the
-    # added optimization that we only need the last two rows
-    # of the matrix.
-    previous_row = np.arange(target.size + 1)
-    for s in source:
-        # Insertion (target grows longer than source):
-        current_row = previous_row + 1
+    m = len(target)
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv = full
+    mv = 0
+    score = m
+    remaining = len(source)
+    for c in source:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & full
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = (mh | ~(xv | ph)) & full
+        mv = ph & xv
 
-        # Substitution or matching:
-        # Target and source items are aligned, and either
-        # are different (cost of 1), or are the same (cost of 0).
-        current_row[1:] = np.minimum(
-                current_row[1:],
-                np.add(previous_row[:-1], target != s))
-
-        # Deletion (target grows shorter than source):
-        current_row[1:] = np.minimum(
-                current_row[1:],
-                current_row[0:-1] + 1)
-
-        previous_row = current_row
-
-    return previous_row[-1]
+        # the last row can drop by at most one per remaining column
+        remaining -= 1
+        if max_distance is not None and score - remaining > max_distance:
+            return max_distance + 1
+    return score
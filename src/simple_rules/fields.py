@@ -0,0 +1,57 @@
+from collections.abc import Sequence
+
+FIELD_SEPARATOR = '.'
+
+
+class _Missing(object):
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __bool__(self):
+        return False
+
+
+MISSING = _Missing()
+
+
+class FieldPath(object):
+    '''
+    A dotted path into a structured record, e.g. http.request.uri, split
+    once so each lookup is a short loop of item accesses.  Numeric segments
+    also index lists and tuples.
+    '''
+    __slots__ = ('path', 'segments')
+
+    def __init__(self, path):
+        self.path = path
+        self.segments = tuple((key, int(key) if key.isdigit() else None)
+                              for key in path.split(FIELD_SEPARATOR))
+        if any(len(key) == 0 for key, _ in self.segments):
+            raise Exception("Invalid field path: {}".format(path))
+
+    def get(self, record):
+        '''
+        :return: the value at the path, MISSING when any segment is absent
+        '''
+        obj = record
+        for key, index in self.segments:
+            try:
+                obj = obj[key]
+            except (KeyError, TypeError, IndexError):
+                if index is None or not isinstance(obj, Sequence) or isinstance(obj, (str, bytes)):
+                    return MISSING
+                try:
+                    obj = obj[index]
+                except IndexError:
+                    return MISSING
+        return obj
+
+    def __eq__(self, other):
+        return isinstance(other, FieldPath) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return "FieldPath({!r})".format(self.path)
@@ -0,0 +1,173 @@
+import os
+import threading
+import types
+
+from .consts import *
+from .config import Config
+from .process import Rule
+from .regex import RegexMatch
+from .actions import EvaluationContext
+
+CHAINS = [IGNORE_CHAIN, MATCH_CHAIN]
+
+
+class EngineSnapshot(object):
+    '''
+    One published version of the configured symbols and rules.  A snapshot
+    is never changed after it is built, a reload builds a new one, reusing
+    the RegexMatch of every unchanged pattern and the compiled Rule of every
+    unchanged rule whose symbols were all reused.
+    '''
+
+    def __init__(self, config_data, sym_maps, chains, changes=None, version=0):
+        self.config_data = config_data
+        self.sym_maps = types.MappingProxyType(sym_maps)
+        self.chains = types.MappingProxyType({chain: tuple(rules.items()) for chain, rules in chains.items()})
+        self.changes = types.MappingProxyType(changes if changes is not None else {})
+        self.version = version
+
+    @classmethod
+    def build_sym_maps(cls, symbols, previous=None):
+        '''
+        :return: (dict of symbol name to RegexMatch, names compiled anew)
+        '''
+        sym_maps = {}
+        compiled = []
+        for name, spec in symbols.items():
+            action = previous.get(name) if previous is not None else None
+            if action is None or action.config_spec() != RegexMatch.normalize_spec(spec):
+                action = RegexMatch.from_config(name, spec)
+                compiled.append(name)
+            sym_maps[name] = action
+        return sym_maps, compiled
+
+    @classmethod
+    def reusable(cls, rule, sym_maps):
+        return all(sym_maps.get(getattr(action, 'name', None)) is action for action in rule.actions())
+
+    @classmethod
+    def build(cls, config_data, previous=None):
+        '''
+        :param config_data: config blocks, see Config.read_json
+        :param previous: snapshot to reuse symbols and rules from
+        :return: new EngineSnapshot, previous is left untouched
+        '''
+        old_symbols = previous.sym_maps if previous is not None else None
+        sym_maps, compiled = cls.build_sym_maps(config_data.get(REGEX_RULES, {}), old_symbols)
+        changes = {'symbols': compiled, 'added': [], 'changed': [], 'removed': [], 'reused': 0}
+
+        chains = {}
+        for chain in CHAINS:
+            rule_strings = config_data.get(chain, {})
+            old_strings = previous.config_data.get(chain, {}) if previous is not None else {}
+            old_rules = dict(previous.chains.get(chain, ())) if previous is not None else {}
+            rules = {}
+            for name, rule_string in rule_strings.items():
+                rule = old_rules.get(name)
+                if rule is not None and old_strings.get(name) == rule_string and cls.reusable(rule, sym_maps):
+                    changes['reused'] += 1
+                    rules[name] = rule
+                    continue
+                rule = Rule.from_token_string(name, rule_string, sym_maps)
+                if rule is None:
+                    raise Exception("Rule {} references unknown symbols: {}".format(name, rule_string))
+                rule.compile()
+                changes['changed' if name in old_rules else 'added'].append((chain, name))
+                rules[name] = rule
+            changes['removed'] += [(chain, name) for name in old_rules if name not in rules]
+            chains[chain] = rules
+
+        version = previous.version + 1 if previous is not None else 0
+        return cls(config_data, sym_maps, chains, changes, version)
+
+    def execute(self, input, chain=MATCH_CHAIN):
+        '''
+        :return: names of the rules of the chain that match the input
+        '''
+        state = EvaluationContext()
+        return [name for name, rule in self.chains.get(chain, ()) if rule.execute(input, state)]
+
+    evaluate = execute
+
+
+class RuleReloader(object):
+    '''
+    Keeps an EngineSnapshot of a TOML rule config current.  Readers take
+    `snapshot` once per evaluation, a reload publishes the new snapshot with
+    a single reference assignment, so evaluations already running finish on
+    the snapshot they started with.  A config that fails to build leaves the
+    published snapshot in place.
+    '''
+
+    def __init__(self, config_path):
+        self.config_path = config_path
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.last_error = None
+        self.watcher = None
+        self.stopping = threading.Event()
+        self.snapshot = None
+        self.reload()
+
+    def file_stamp(self):
+        stat = os.stat(self.config_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        '''
+        :return: the published snapshot
+        '''
+        with self.lock:
+            stamp = self.file_stamp()
+            config_data = Config.read_config(self.config_path)
+            current = self.snapshot
+            if current is not None and config_data == current.config_data:
+                self.stamp = stamp
+                return current
+            self.snapshot = EngineSnapshot.build(config_data, current)
+            self.stamp = stamp
+            return self.snapshot
+
+    def check(self):
+        '''
+        Reload when the file changed since the last load.
+
+        :return: True when a new snapshot was published
+        '''
+        if self.file_stamp() == self.stamp:
+            return False
+        current = self.snapshot
+        return self.reload() is not current
+
+    def watch(self, interval=1.0):
+        '''
+        Poll the config file from a daemon thread every interval seconds.
+        '''
+        if self.watcher is not None:
+            return self.watcher
+        self.stopping.clear()
+
+        def poll():
+            while not self.stopping.wait(interval):
+                try:
+                    self.check()
+                    self.last_error = None
+                except Exception as e:
+                    # keep serving the last good snapshot
+                    self.last_error = e
+
+        self.watcher = threading.Thread(target=poll, name='simple-rules-reload', daemon=True)
+        self.watcher.start()
+        return self.watcher
+
+    def stop(self):
+        if self.watcher is None:
+            return
+        self.stopping.set()
+        self.watcher.join()
+        self.watcher = None
+
+    def execute(self, input, chain=MATCH_CHAIN):
+        return self.snapshot.execute(input, chain)
+
+    evaluate = execute
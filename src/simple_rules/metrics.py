@@ -0,0 +1,134 @@
+from .consts import *
+from .actions import ActionProfile
+
+
+class RuleMetrics(object):
+    '''
+    Opt-in call counts, outcome counts and latency histograms per rule name
+    and per action name, plus operands skipped by short-circuiting per
+    predicate group.  Rules that are not attached run their uninstrumented
+    compiled code, actions pay the profile checks they always have.  Action
+    metrics are kept in ActionBaseClass.metrics_profile, apart from the
+    profile used by Rule.reorder, and stay on while any attached rule uses
+    the action.
+    '''
+
+    def __init__(self):
+        self.rules = {}
+        self.actions = {}
+        self.groups = {}
+        # attached rules, and attached rules per action
+        self.attached = set()
+        self.action_users = {}
+
+    def rule_profile(self, name):
+        if name not in self.rules:
+            self.rules[name] = ActionProfile()
+        return self.rules[name]
+
+    def action_profile(self, name):
+        if name not in self.actions:
+            self.actions[name] = ActionProfile()
+        return self.actions[name]
+
+    def group_skips(self, rule_name, predicates):
+        '''
+        :return: dict of group key to skipped operand count for a rule
+        '''
+        skips = self.groups.setdefault(rule_name, {})
+        for group_key in predicates:
+            skips.setdefault(group_key, 0)
+        return skips
+
+    def attach(self, rules):
+        for rule in rules:
+            rule.metrics = self
+            rule.compiled = None
+            if rule in self.attached:
+                continue
+            self.attached.add(rule)
+            for action in set(rule.actions()):
+                users = self.action_users.get(action, 0)
+                if users == 0:
+                    action.metrics_profile = self.action_profile(getattr(action, 'name', type(action).__name__))
+                self.action_users[action] = users + 1
+
+    def detach(self, rules):
+        for rule in rules:
+            if rule.metrics is self:
+                rule.metrics = None
+                rule.compiled = None
+            if rule not in self.attached:
+                continue
+            self.attached.discard(rule)
+            for action in set(rule.actions()):
+                users = self.action_users.pop(action, 0) - 1
+                if users > 0:
+                    self.action_users[action] = users
+                else:
+                    action.metrics_profile = None
+
+    def reset(self):
+        for profile in list(self.rules.values()) + list(self.actions.values()):
+            profile.reset()
+        for skips in self.groups.values():
+            for group_key in skips:
+                skips[group_key] = 0
+
+    @classmethod
+    def profile_snapshot(cls, profile):
+        return {
+            'calls': profile.calls,
+            'true': profile.true_count,
+            'false': profile.false_count,
+            'total_time': profile.total_time,
+            'buckets': dict(zip([str(b) for b in ActionProfile.LATENCY_BUCKETS] + ['+Inf'], profile.buckets)),
+        }
+
+    def snapshot(self):
+        '''
+        :return: plain dict copy of every counter
+        '''
+        return {
+            'rules': {name: self.profile_snapshot(p) for name, p in self.rules.items()},
+            'actions': {name: self.profile_snapshot(p) for name, p in self.actions.items()},
+            'group_skips': {name: dict(skips) for name, skips in self.groups.items()},
+        }
+
+    @classmethod
+    def escape(cls, value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @classmethod
+    def prometheus_profiles(cls, prefix, label, profiles):
+        lines = []
+        for suffix, kind, value in [('calls_total', 'counter', lambda p: p.calls),
+                                    ('true_total', 'counter', lambda p: p.true_count),
+                                    ('false_total', 'counter', lambda p: p.false_count)]:
+            lines.append("# TYPE {}_{} {}".format(prefix, suffix, kind))
+            for name, profile in profiles.items():
+                lines.append('{}_{}{{{}="{}"}} {}'.format(prefix, suffix, label, cls.escape(name), value(profile)))
+
+        lines.append("# TYPE {}_latency_seconds histogram".format(prefix))
+        for name, profile in profiles.items():
+            name = cls.escape(name)
+            cumulative = 0
+            for bound, count in zip(list(ActionProfile.LATENCY_BUCKETS) + ['+Inf'], profile.buckets):
+                cumulative += count
+                lines.append('{}_latency_seconds_bucket{{{}="{}",le="{}"}} {}'.format(prefix, label, name, bound, cumulative))
+            lines.append('{}_latency_seconds_sum{{{}="{}"}} {}'.format(prefix, label, name, profile.total_time))
+            lines.append('{}_latency_seconds_count{{{}="{}"}} {}'.format(prefix, label, name, profile.calls))
+        return lines
+
+    def to_prometheus(self, prefix='simple_rules'):
+        '''
+        :return: metrics in the Prometheus text exposition format
+        '''
+        lines = self.prometheus_profiles(prefix + '_rule', 'rule', self.rules)
+        lines += self.prometheus_profiles(prefix + '_action', 'action', self.actions)
+        lines.append("# TYPE {}_group_skipped_operands_total counter".format(prefix))
+        for name, skips in self.groups.items():
+            for group_key, count in skips.items():
+                lines.append('{}_group_skipped_operands_total{{rule="{}",group="{}"}} {}'.format(
+                    prefix, self.escape(name), group_key, count))
+        return "\n".join(lines) + "\n"
@@ -1,15 +1,19 @@
+import re
 import string
+import sys
 from .consts import *
 
 
 class BaseEntity(object):
+    __slots__ = ('value', 'offset')
     TYPE = ''
     VALUE = ''
     LEN = 0
     TERMINATORS = []
 
-    def __init__(self, value=''):
+    def __init__(self, value='', offset=-1):
         self.value = value
+        self.offset = offset
 
     def get_value(self):
         if self.TYPE == SYMBOL:
@@ -63,6 +67,7 @@ class BaseEntity(object):
 
 
 class Space(BaseEntity):
+    __slots__ = ()
     TYPE = SPACE
     VALUE = SPACE_VALUE
     LEN = len(SPACE_VALUE)
@@ -92,13 +97,14 @@ class Space(BaseEntity):
 
 
 class AndOp(BaseEntity):
+    __slots__ = ()
     TYPE = AND
     VALUE = AND
     LEN = len(AND)
     TERMINATORS = AND_TERMINATORS
 
-    def __init__(self):
-        super(AndOp, self).__init__()
+    def __init__(self, offset=-1):
+        super(AndOp, self).__init__(offset=offset)
 
     @classmethod
     def can_parse(cls, tokens):
@@ -118,13 +124,14 @@ class AndOp(BaseEntity):
 
 
 class OrOp(BaseEntity):
+    __slots__ = ()
     TYPE = OR
     VALUE = OR
     LEN = len(OR)
     TERMINATORS = OR_TERMINATORS
 
-    def __init__(self):
-        super(OrOp, self).__init__()
+    def __init__(self, offset=-1):
+        super(OrOp, self).__init__(offset=offset)
 
     @classmethod
     def can_parse(cls, tokens):
@@ -139,17 +146,18 @@ class OrOp(BaseEntity):
         if cls.can_parse(tokens):
             for _ in cls.VALUE:
                 tokens.pop(0)
-            return AndOp()
+            return OrOp()
         return None
 
 class EnterGroupOp(BaseEntity):
+    __slots__ = ()
     TYPE = ENTER_GROUP
     VALUE = ENTER_GROUP_VALUE
     LEN = len(ENTER_GROUP_VALUE)
     TERMINATORS = []
 
-    def __init__(self):
-        super(EnterGroupOp, self).__init__()
+    def __init__(self, offset=-1):
+        super(EnterGroupOp, self).__init__(offset=offset)
 
     @classmethod
     def can_parse(cls, tokens):
@@ -169,13 +177,14 @@ class EnterGroupOp(BaseEntity):
 
 
 class ExitGroupOp(BaseEntity):
+    __slots__ = ()
     TYPE = EXIT_GROUP
     VALUE = EXIT_GROUP_VALUE
     LEN = len(EXIT_GROUP_VALUE)
     TERMINATORS = []
 
-    def __init__(self):
-        super(ExitGroupOp, self).__init__()
+    def __init__(self, offset=-1):
+        super(ExitGroupOp, self).__init__(offset=offset)
 
     @classmethod
     def can_parse(cls, tokens):
@@ -193,13 +202,14 @@ class ExitGroupOp(BaseEntity):
 
 
 class Symbol(BaseEntity):
+    __slots__ = ()
     TYPE = SYMBOL
     VALUE = ''
     LEN = -1
     TERMINATORS = SYM_TERMINATORS
 
-    def __init__(self, value):
-        super(Symbol, self).__init__(value)
+    def __init__(self, value, offset=-1):
+        super(Symbol, self).__init__(value, offset=offset)
 
     @classmethod
     def can_parse(cls, tokens):
@@ -219,30 +229,84 @@ class Symbol(BaseEntity):
             return Symbol("".join(value))
         return None
 
+# Shared operator tokens for rule ASTs, they carry no offset and must not be mutated
+AND_OPERATOR = AndOp()
+OR_OPERATOR = OrOp()
+
+
+def _char_class(chars):
+    return "[{}]".format("".join(re.escape(c) for c in chars))
+
+
 class Parser(object):
+    # One alternative per entity, tried in the same order the character
+    # based parsers were tried.  Every character matches one of them, so a
+    # single left-to-right scan tokenizes the whole string.
+    TOKEN_REGEX = re.compile("|".join([
+        "(?P<{}>{}+)".format(SPACE, _char_class(SPACE_VALUES)),
+        "(?P<{}>{})".format(ENTER_GROUP, re.escape(ENTER_GROUP_VALUE)),
+        "(?P<{}>{})".format(EXIT_GROUP, re.escape(EXIT_GROUP_VALUE)),
+        "(?P<{}>{})(?={})".format(AND, re.escape(AND), _char_class(AND_TERMINATORS)),
+        "(?P<{}>{})(?={})".format(OR, re.escape(OR), _char_class(OR_TERMINATORS)),
+        "(?P<{}>[^{}]+)".format(SYMBOL, "".join(re.escape(c) for c in SYM_TERMINATORS)),
+    ]))
+
+    TOKEN_CLASSES = {
+        SPACE: Space,
+        ENTER_GROUP: EnterGroupOp,
+        EXIT_GROUP: ExitGroupOp,
+        AND: AndOp,
+        OR: OrOp,
+    }
+
+    @classmethod
+    def build_token(cls, match, base=0):
+        offset = base + match.start()
+        if match.lastgroup == SYMBOL:
+            return Symbol(sys.intern(match.group()), offset=offset)
+        return cls.TOKEN_CLASSES[match.lastgroup](offset=offset)
+
+    @classmethod
+    def iter_string(cls, token_string, base=0):
+        '''
+        :param token_string: rule string to tokenize
+        :param base: offset added to each token offset
+        :return: generator of parsed entities, each with its source offset
+        '''
+        for match in cls.TOKEN_REGEX.finditer(token_string):
+            yield cls.build_token(match, base)
+
+    @classmethod
+    def iter_chunks(cls, chunks):
+        '''
+        :param chunks: iterable of string chunks (e.g. a file opened in text mode)
+        :return: generator of parsed entities, offsets are relative to the whole stream
+        '''
+        base = 0
+        pending = ''
+        for chunk in chunks:
+            buf = pending + chunk
+            last = None
+            for match in cls.TOKEN_REGEX.finditer(buf):
+                if last is not None:
+                    yield cls.build_token(last, base)
+                last = match
+            # the last token may continue in the next chunk, hold it back
+            if last is None:
+                pending = ''
+                base += len(buf)
+            else:
+                pending = buf[last.start():]
+                base += last.start()
+        for token in cls.iter_string(pending, base):
+            yield token
 
     @classmethod
     def parse_string(cls, token_string):
-        return cls.parse_tokens([i for i in token_string])
+        return list(cls.iter_string(token_string))
 
     @classmethod
     def parse_tokens(cls, tokens):
-        parsed = []
-        while len(tokens) > 0:
-            v = None
-            if Space.can_parse(tokens):
-                v = Space.parse(tokens)
-            elif EnterGroupOp.can_parse(tokens):
-                v = EnterGroupOp.parse(tokens)
-            elif ExitGroupOp.can_parse(tokens):
-                v = ExitGroupOp.parse(tokens)
-            elif AndOp.can_parse(tokens):
-                v = AndOp.parse(tokens)
-            elif OrOp.can_parse(tokens):
-                v = OrOp.parse(tokens)
-            elif Symbol.can_parse(tokens):
-                v = Symbol.parse(tokens)
-            parsed.append(v)
-            if v is None:
-                break
-        return parsed
+        token_string = "".join(tokens)
+        del tokens[:]
+        return cls.parse_string(token_string)
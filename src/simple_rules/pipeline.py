@@ -0,0 +1,208 @@
+import threading
+import time
+
+import regex
+
+from .consts import *
+from .config import Config
+from .regex import RegexMatch, BYTES_TYPES
+from .ruleset import RuleSet
+from .batch import execute_many, PROCESS_BACKEND
+
+IGNORE_PATTERNS_STAGE = 'ignore-patterns'
+IGNORE_CHAIN_STAGE = IGNORE_CHAIN
+MATCH_CHAIN_STAGE = MATCH_CHAIN
+STAGES = [IGNORE_PATTERNS_STAGE, IGNORE_CHAIN_STAGE, MATCH_CHAIN_STAGE]
+# numbered back references break when a pattern is embedded in a larger one
+NUMBERED_REFERENCE = regex.compile(r'\\[1-9]|\\g<\d+>|\(\?P?\(\d+\)')
+
+
+class RulePipeline(object):
+    '''
+    Ignore first, then match.  Every ignore pattern is compiled into one
+    alternation that is tried before anything else, then the ignore-chain
+    rules run, and only inputs neither of them dropped reach the match-chain
+    rules.  When both chains use the same symbols, the symbol bitmap is
+    matched once, in the ignore-chain stage, and both chains are evaluated
+    from it.  Inputs seen, inputs dropped and time spent are counted per
+    stage, under a lock so threads can share a pipeline, and execute_many
+    merges in the counts of process workers.
+    '''
+
+    def __init__(self, ignore_patterns=None, ignore_rules=None, match_rules=None):
+        '''
+        :param ignore_patterns: dict of name to regular expression, a match drops the input
+        :param ignore_rules: RuleSet of ignore-chain rules, any match drops the input
+        :param match_rules: RuleSet of match-chain rules
+        '''
+        self.ignore_patterns = dict(ignore_patterns) if ignore_patterns is not None else {}
+        self.ignore_rules = ignore_rules if ignore_rules is not None and len(ignore_rules.rules) > 0 else None
+        self.match_rules = match_rules
+        self.combined, self.separate = self.build_ignore_regex(self.ignore_patterns)
+        # both chains built from the same REGEX_RULES share one bitmap
+        self.shared_symbols = self.ignore_rules is not None and self.match_rules is not None and \
+            self.ignore_rules.bits == self.match_rules.bits and \
+            self.ignore_rules.symbols == self.match_rules.symbols
+        self.lock = threading.Lock()
+        engines = [ruleset for ruleset in [self.ignore_rules, self.match_rules] if ruleset is not None]
+        self.targets_bytes = len(engines) > 0 and all(ruleset.targets_bytes for ruleset in engines)
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config=Config, prefilter=False):
+        ignore_rules = RuleSet.from_config(config=config, prefilter=prefilter, chain=IGNORE_CHAIN)
+        match_rules = RuleSet.from_config(config=config, prefilter=prefilter, chain=MATCH_CHAIN)
+        return cls(config.CONFIG.get(IGNORE_REGEX_RULES, {}), ignore_rules, match_rules)
+
+    @classmethod
+    def build_ignore_regex(cls, patterns):
+        '''
+        :return: (combined regex or None, list of RegexMatch run on their own)
+        '''
+        parts = []
+        separate = []
+        for name, spec in patterns.items():
+            action = RegexMatch.from_config(name, spec)
+            # bytes-target patterns match bytes-like inputs in place
+            if action.field is not None or action.target == BYTES_TARGET or NUMBERED_REFERENCE.search(action.pattern):
+                separate.append(action)
+            else:
+                parts.append('(?:{})'.format(action.pattern))
+        if len(parts) == 0:
+            return None, separate
+        try:
+            return regex.compile("|".join(parts)), separate
+        except regex.error:
+            return None, [RegexMatch.from_config(name, spec) for name, spec in patterns.items()]
+
+    def __getstate__(self):
+        # compiled regexes are rebuilt on unpickling
+        return {'ignore_patterns': self.ignore_patterns, 'ignore_rules': self.ignore_rules,
+                'match_rules': self.match_rules}
+
+    def __setstate__(self, state):
+        self.__init__(state['ignore_patterns'], state['ignore_rules'], state['match_rules'])
+
+    def compile(self):
+        for ruleset in [self.ignore_rules, self.match_rules]:
+            if ruleset is not None:
+                ruleset.compile()
+
+    def reset(self):
+        with self.lock:
+            self.inputs = {stage: 0 for stage in STAGES}
+            self.drops = {stage: 0 for stage in STAGES}
+            self.times = {stage: 0.0 for stage in STAGES}
+
+    def take_stats(self):
+        '''
+        :return: the raw stage counters, which are then reset, see merge_stats
+        '''
+        with self.lock:
+            stats = {'inputs': self.inputs, 'drops': self.drops, 'times': self.times}
+            self.inputs = {stage: 0 for stage in STAGES}
+            self.drops = {stage: 0 for stage in STAGES}
+            self.times = {stage: 0.0 for stage in STAGES}
+        return stats
+
+    def merge_stats(self, stats):
+        '''
+        :param stats: counters from take_stats, e.g. of a worker copy
+        '''
+        with self.lock:
+            for stage in STAGES:
+                self.inputs[stage] += stats['inputs'][stage]
+                self.drops[stage] += stats['drops'][stage]
+                self.times[stage] += stats['times'][stage]
+
+    def ignored(self, input):
+        '''
+        :return: True when an ignore pattern matches the input
+        '''
+        if self.combined is not None:
+            text = input
+            if isinstance(input, BYTES_TYPES):
+                # text-target patterns match the decoded text, like RegexMatch
+                text = str(input, ENCODING, 'replace')
+            elif not isinstance(input, str):
+                text = str(input)
+            if self.combined.match(text):
+                return True
+        for action in self.separate:
+            if action.match(input):
+                return True
+        return False
+
+    def execute(self, input):
+        '''
+        :param input: input string or record
+        :return: names of the match-chain rules that match, [] for ignored inputs
+        '''
+        counts = []
+        matched = self.run_stages(input, counts)
+        with self.lock:
+            for stage, dropped, elapsed in counts:
+                self.inputs[stage] += 1
+                self.drops[stage] += dropped
+                self.times[stage] += elapsed
+        return matched
+
+    def run_stages(self, input, counts):
+        '''
+        :param counts: list that gets (stage, dropped, elapsed) for every stage the input reached
+        :return: names of the match-chain rules that match, [] for ignored inputs
+        '''
+        clock = time.perf_counter
+        start = clock()
+        if self.ignored(input):
+            counts.append((IGNORE_PATTERNS_STAGE, True, clock() - start))
+            return []
+        now = clock()
+        counts.append((IGNORE_PATTERNS_STAGE, False, now - start))
+        start = now
+
+        bitmap = None
+        if self.ignore_rules is not None:
+            if self.shared_symbols:
+                bitmap = self.ignore_rules.match_symbols(input)
+                dropped = len(self.ignore_rules.execute_bitmap(input, bitmap)) > 0
+            else:
+                dropped = len(self.ignore_rules.execute(input)) > 0
+            now = clock()
+            counts.append((IGNORE_CHAIN_STAGE, dropped, now - start))
+            start = now
+            if dropped:
+                return []
+
+        if self.match_rules is None:
+            return []
+        if bitmap is not None:
+            matched = self.match_rules.execute_bitmap(input, bitmap)
+        else:
+            matched = self.match_rules.execute(input)
+        counts.append((MATCH_CHAIN_STAGE, len(matched) == 0, clock() - start))
+        return matched
+
+    evaluate = execute
+
+    def execute_many(self, inputs, workers=None, backend=PROCESS_BACKEND, chunk_size=1000, ordered=True):
+        '''
+        :return: generator of matched rule names for each input, see
+        batch.execute_many.  Worker counts are merged as their chunks finish.
+        '''
+        return execute_many(self, inputs, workers=workers, backend=backend,
+                            chunk_size=chunk_size, ordered=ordered)
+
+    def stats(self):
+        '''
+        :return: dict of stage to inputs, drops, drop_rate and total time in seconds
+        '''
+        return {
+            stage: {
+                'inputs': self.inputs[stage],
+                'drops': self.drops[stage],
+                'drop_rate': self.drops[stage] / self.inputs[stage] if self.inputs[stage] else 0.0,
+                'time': self.times[stage],
+            }
+            for stage in STAGES
+        }
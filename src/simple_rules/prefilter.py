@@ -0,0 +1,159 @@
+import regex
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+MIN_LITERAL_LENGTH = 2
+REPEATS = [sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT] + \
+    ([sre_parse.POSSESSIVE_REPEAT] if hasattr(sre_parse, 'POSSESSIVE_REPEAT') else [])
+# syntax sre parses differently from the regex module: fuzzy matching
+# constraints, e.g. (?:abc){e<=1}, parse as plain literals in sre, and the
+# VERSION1 flag turns on set operations
+REGEX_ONLY_SYNTAX = regex.compile(r'\{[^}]*[a-zA-Z]|V1')
+
+
+def _has_nested_set(pattern):
+    '''
+    :return: True when a character class contains a '[', e.g. a POSIX class
+    like [[:alpha:]] or a nested set, which the regex module reads as one
+    set and sre as a set followed by literals
+    '''
+    pos = 0
+    in_set = False
+    while pos < len(pattern):
+        c = pattern[pos]
+        if c == '\\':
+            pos += 2
+            continue
+        if in_set:
+            if c == '[':
+                return True
+            if c == ']':
+                in_set = False
+        elif c == '[':
+            in_set = True
+            # a leading ^ negates, a ] right after the opening is a literal
+            pos += 1
+            if pattern[pos:pos + 1] == '^':
+                pos += 1
+            if pattern[pos:pos + 1] == ']':
+                pos += 1
+            continue
+        pos += 1
+    return False
+
+
+def _required_runs(items, flags):
+    '''
+    :return: literal runs that every match of the parsed items must contain
+    '''
+    runs = []
+    current = []
+    for op, av in items:
+        if op is sre_parse.LITERAL and not flags & sre_parse.SRE_FLAG_IGNORECASE:
+            current.append(chr(av))
+            continue
+        if len(current) > 0:
+            runs.append("".join(current))
+            current = []
+        if op is sre_parse.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            runs += _required_runs(sub, (flags | add_flags) & ~del_flags)
+        elif op in REPEATS and av[0] >= 1:
+            runs += _required_runs(av[2], flags)
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            runs += _required_runs(av, flags)
+    if len(current) > 0:
+        runs.append("".join(current))
+    return runs
+
+
+def required_literal(pattern):
+    '''
+    :param pattern: regular expression string
+    :return: the longest literal any match must contain, or None when no
+    literal can be extracted safely.  The pattern is read with sre, so any
+    syntax where sre and the regex module could disagree gives up.
+    '''
+    if not isinstance(pattern, str) or REGEX_ONLY_SYNTAX.search(pattern) or _has_nested_set(pattern):
+        return None
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        # syntax only the regex module understands
+        return None
+    runs = _required_runs(parsed, parsed.state.flags)
+    if len(runs) == 0:
+        return None
+    literal = max(runs, key=len)
+    return literal if len(literal) >= MIN_LITERAL_LENGTH else None
+
+
+class LiteralPrefilter(object):
+    '''
+    One multi-literal scan over an input reports which values (usually
+    actions) have their required literal present.  Uses pyahocorasick when
+    installed (the prefilter extra), otherwise a substring test per literal,
+    which measured faster than a regex named list searched at every
+    position.  Literals are str, or bytes to scan bytes-like inputs.
+    '''
+
+    def __init__(self, entries):
+        '''
+        :param entries: list of (literal, value)
+        '''
+        self.values = {}
+        for literal, value in entries:
+            self.values.setdefault(literal, []).append(value)
+        self.entries = len(entries)
+        self.inputs = 0
+        self.rejects = 0
+
+        self.automaton = None
+        self.literals = list(self.values)
+        # memoryview and mmap have no substring test, they are searched
+        self.searches = None
+        self.is_bytes = any(isinstance(literal, bytes) for literal in self.literals)
+        if self.is_bytes:
+            self.searches = [(literal, regex.compile(regex.escape(literal)).search) for literal in self.literals]
+        elif len(self.values) > 0 and ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for literal in self.values:
+                self.automaton.add_word(literal, literal)
+            self.automaton.make_automaton()
+
+    def found_literals(self, input):
+        if self.automaton is not None:
+            return set(literal for _, literal in self.automaton.iter(input))
+        if self.searches is not None and type(input) not in (bytes, bytearray):
+            return [literal for literal, search in self.searches if search(input)]
+        return [literal for literal in self.literals if literal in input]
+
+    def candidates(self, input):
+        '''
+        :param input: input string, or bytes-like input for bytes literals
+        :return: values whose literal occurs in the input
+        '''
+        result = []
+        for literal in self.found_literals(input):
+            result += self.values[literal]
+        self.inputs += 1
+        self.rejects += self.entries - len(result)
+        return result
+
+    def stats(self):
+        checks = self.inputs * self.entries
+        return {
+            'inputs': self.inputs,
+            'entries': self.entries,
+            'rejects': self.rejects,
+            'reject_rate': self.rejects / checks if checks else 0.0,
+        }
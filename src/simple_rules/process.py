@@ -1,18 +1,109 @@
 from .consts import *
-from .validate import TokenStreamValidator
-from .parser import Parser
+from .validate import TokenStreamValidator, PredicateTable
+from .parser import Parser, AND_OPERATOR, OR_OPERATOR
+from .actions import EvaluationContext
+from .batch import execute_many, PROCESS_BACKEND
+
+
+def evaluate_shared(state, group_key, fn, input):
+    '''
+    Evaluate a group interned by several rules, once per input when the
+    state is an EvaluationContext.
+    '''
+    if isinstance(state, EvaluationContext):
+        return state.group(group_key, fn, input)
+    return fn(input, state)
 
 
 class Rule(object):
 
-    def __init__(self, name, ast, main_predicate=0):
+    def __init__(self, name, ast, main_predicate=0, root=None):
         self.predicates = ast
         self.name = name
         self.main_predicate = main_predicate
+        # interned main group, holds the rule's entries in the PredicateTable
+        self.root = root
+        self.compiled = None
+        # metrics.RuleMetrics while instrumented, see RuleMetrics.attach
+        self.metrics = None
 
     def execute(self, input, state={}):
+        if self.compiled is None:
+            self.compile()
+        return self.compiled(input, state)
+
+    def evaluate(self, input):
+        return bool(self.execute(input))
+
+    def execute_many(self, inputs, workers=None, backend=PROCESS_BACKEND, chunk_size=1000, ordered=True):
+        '''
+        :return: generator of the truth of the rule for each input, see batch.execute_many
+        '''
+        return execute_many(self, inputs, workers=workers, backend=backend,
+                            chunk_size=chunk_size, ordered=ordered)
+
+    def __getstate__(self):
+        # generated functions do not pickle, workers compile their own
+        state = self.__dict__.copy()
+        state['compiled'] = None
+        return state
+
+    def interpret(self, input, state={}):
         return self.process_predicate(self.main_predicate, input, state=state)
 
+    def compile(self):
+        if self.metrics is None:
+            self.compiled = self.compile_function()
+            return self.compiled
+
+        # instrumented variant, uninstrumented rules pay nothing for it
+        profile = self.metrics.rule_profile(self.name)
+        fn = self.compile_function(skips=self.metrics.group_skips(self.name, self.predicates))
+        self.compiled = lambda input, state={}: profile.record(fn, input, state)
+        return self.compiled
+
+    def compile_function(self, resolve=None, skips=None):
+        '''
+        Translate the predicate groups into generated Python source, one
+        function per group, so execution does not re-walk the tree.  Each
+        group keeps the interpreter semantics: operands run left to right,
+        OR returns on a true result, AND returns on a false result.
+
+        :param resolve: optional callable mapping an action node to the
+        callable(input, state) used in its place, defaults to node.execute
+        :param skips: optional dict of group key to a count of operands
+        skipped by short-circuiting, updated by the generated code
+        :return: function(input, state) evaluating the main predicate
+        '''
+        resolve = resolve if resolve is not None else (lambda node: node.execute)
+        namespace = {'skips': skips, 'shared': evaluate_shared}
+        lines = []
+        for group_key in sorted(self.predicates):
+            lines.append("def group_{}(input, state):".format(group_key))
+            lines.append("    last_result = None")
+            members = self.predicates[group_key]
+            for pos, node in enumerate(members):
+                skip = ""
+                if skips is not None and node.TYPE in (OR, AND):
+                    skipped = len([n for n in members[pos:] if n.TYPE in (ACTION, PREDICATE)])
+                    skip = "skips[{}] += {}; ".format(group_key, skipped)
+                if node.TYPE == ACTION:
+                    action = "action_{}_{}".format(group_key, pos)
+                    namespace[action] = resolve(node)
+                    lines.append("    last_result = {}(input, state)".format(action))
+                elif node.TYPE == PREDICATE and node.users > 1:
+                    lines.append("    last_result = shared(state, {0}, group_{0}, input)".format(node.num))
+                elif node.TYPE == PREDICATE:
+                    lines.append("    last_result = group_{}(input, state)".format(node.num))
+                elif node.TYPE == OR:
+                    lines.append("    if last_result: {}return last_result".format(skip))
+                elif node.TYPE == AND:
+                    lines.append("    if not last_result: {}return last_result".format(skip))
+            lines.append("    return last_result")
+        source = "\n".join(lines)
+        exec(compile(source, "<rule {}>".format(self.name), "exec"), namespace)
+        return namespace["group_{}".format(self.main_predicate)]
+
     def process_predicate(self, group_key, input, last_result=None, state={}):
         rule_group = self.predicates[group_key]
         for node in rule_group:
@@ -26,15 +117,136 @@ class Rule(object):
                 return last_result
         return last_result
 
+    def actions(self):
+        return [node for group in self.predicates.values() for node in group if node.TYPE == ACTION]
+
+    def enable_profiling(self):
+        for action in self.actions():
+            action.enable_profiling()
+
+    def disable_profiling(self):
+        for action in self.actions():
+            action.disable_profiling()
+
+    def estimate_operand(self, node, min_calls):
+        '''
+        :return: (mean cost, probability of a true result) or None if unknown
+        '''
+        if node.TYPE == PREDICATE:
+            return self.estimate_group(node.num, min_calls)
+        profile = getattr(node, 'profile', None)
+        if not node.SIDE_EFFECT_FREE or profile is None or profile.calls < min_calls:
+            return None
+        return profile.mean_time, profile.true_rate
+
+    def pure_group_operator(self, group_key):
+        '''
+        :return: AND or OR when the group is operands joined by one operator,
+        None for mixed groups, '' for a single operand
+        '''
+        members = self.predicates[group_key]
+        if len(members) % 2 == 0:
+            return None
+        if any(node.TYPE not in (ACTION, PREDICATE) for node in members[0::2]):
+            return None
+        operators = set(node.TYPE for node in members[1::2])
+        if len(operators) == 0:
+            return ''
+        if len(operators) > 1 or not operators.issubset({AND, OR}):
+            return None
+        return operators.pop()
+
+    def estimate_group(self, group_key, min_calls):
+        operator = self.pure_group_operator(group_key)
+        if operator is None:
+            return None
+        estimates = [self.estimate_operand(node, min_calls) for node in self.predicates[group_key][0::2]]
+        if any(estimate is None for estimate in estimates):
+            return None
+        # expected cost in the current order, assuming independent operands
+        cost = 0.0
+        reached = 1.0
+        for op_cost, p_true in estimates:
+            cost += reached * op_cost
+            reached *= p_true if operator == AND else 1.0 - p_true
+        p_true = reached if operator == AND else 1.0 - reached
+        if operator == '':
+            p_true = estimates[0][1]
+        return cost, p_true
+
+    def post_order(self):
+        '''
+        :return: group keys reachable from the main predicate, children first
+        '''
+        order = []
+        seen = set()
+        stack = [(self.main_predicate, False)]
+        while len(stack) > 0:
+            group_key, done = stack.pop()
+            if done:
+                order.append(group_key)
+                continue
+            if group_key in seen:
+                continue
+            seen.add(group_key)
+            stack.append((group_key, True))
+            for node in self.predicates[group_key]:
+                if node.TYPE == PREDICATE:
+                    stack.append((node.num, False))
+        return order
+
+    def reorder(self, min_calls=1):
+        '''
+        Reorder the operands of pure AND and pure OR groups using profiled
+        cost and outcome rates, so cheap decisive checks run first.  Only
+        groups whose operands are all side effect free and profiled are
+        touched.  The truth of the result is preserved, the returned value
+        may come from a different operand.
+
+        :param min_calls: profiled calls required before an action is trusted
+        :return: number of groups that were reordered
+        '''
+        reordered = 0
+        # handle children before their parents
+        for group_key in self.post_order():
+            operator = self.pure_group_operator(group_key)
+            if operator not in (AND, OR):
+                continue
+            members = self.predicates[group_key]
+            operands = members[0::2]
+            estimates = [self.estimate_operand(node, min_calls) for node in operands]
+            if any(estimate is None for estimate in estimates):
+                continue
+
+            def rank(pos):
+                cost, p_true = estimates[pos]
+                decisive = 1.0 - p_true if operator == AND else p_true
+                return cost / decisive if decisive > 0 else float('inf')
+
+            order = sorted(range(len(operands)), key=rank)
+            if order == list(range(len(operands))):
+                continue
+            new_members = []
+            for pos in order:
+                if len(new_members) > 0:
+                    new_members.append(members[1])
+                new_members.append(operands[pos])
+            self.predicates[group_key] = new_members
+            reordered += 1
+
+        if reordered > 0:
+            self.compiled = None
+        return reordered
+
     @classmethod
     def from_token_stream(cls, name, token_stream, sym_maps):
         validator = TokenStreamValidator(token_stream)
-        ast = None
-        if validator.validate_with_symbols(sym_maps):
-            ast = cls.build_mapped_rule(validator, sym_maps)
-        if ast is None:
+        validator.validate_without_symbols()
+        failed, _ = validator.validate_with_symbols(sym_maps)
+        if failed:
             return None
-        return cls(name, ast)
+        ast = cls.build_mapped_rule(validator, sym_maps)
+        return cls.from_groups(name, ast, validator.main_group.num)
 
     @classmethod
     def from_token_string(cls, name, token_stream, sym_maps):
@@ -45,15 +257,54 @@ class Rule(object):
     @classmethod
     def build_mapped_rule(cls, validator: TokenStreamValidator, sym_maps):
         default_match_node = None
-        ast = {k: [] for k, in validator.groups.keys()}
+        ast = {k: [] for k in validator.groups.keys()}
         for node_name in ast:
-            for node in validator.groups[node_name]:
-                value = node.get_value()
+            for node in validator.groups[node_name].get_members():
                 if node.TYPE == SYMBOL:
-                    ast[node_name].append(sym_maps.get(value, default_match_node))
+                    ast[node_name].append(sym_maps.get(node.get_value(), default_match_node))
                 else:
                     ast[node_name].append(node)
         return ast
 
+    @classmethod
+    def intern_groups(cls, groups, main_predicate):
+        '''
+        Hash-cons the groups of a rule bottom up through the PredicateTable.
+
+        :param groups: dict of group key to members, child groups referenced
+        by nodes with a num
+        :return: (dict of interned group number to members, interned main
+        group, every group interned, see PredicateTable.hold)
+        '''
+        interned = {}
+        held = []
+
+        def visit(group_key):
+            members = []
+            for node in groups[group_key]:
+                if node.TYPE == PREDICATE:
+                    members.append(visit(node.num))
+                elif node.TYPE == AND:
+                    members.append(AND_OPERATOR)
+                elif node.TYPE == OR:
+                    members.append(OR_OPERATOR)
+                else:
+                    members.append(node)
+            group = PredicateTable.intern(members)
+            interned[group.num] = group.members
+            held.append(group)
+            return group
+
+        root = visit(main_predicate)
+        return interned, root, held
+
+    @classmethod
+    def from_groups(cls, name, groups, main_predicate=0):
+        ast, root, held = cls.intern_groups(groups, main_predicate)
+        rule = cls(name, ast, main_predicate=root.num, root=root)
+        # users drop again once the rule is gone, e.g. replaced by a reload
+        PredicateTable.hold(rule, held)
+        return rule
+
     def __str__(self):
         return str(self.predicates[self.main_predicate])
@@ -1,18 +1,134 @@
+from collections.abc import Mapping
+import mmap
+
+import regex
+from .consts import *
 from .actions import ActionBaseClass
+from .fields import FieldPath, MISSING
+from .prefilter import required_literal
+
+BYTES_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+
+# escapes for characters beyond ASCII, which a bytes pattern would read as
+# single bytes: \x80-\xff, \x{...}, \u, \U, \N{...} and octal \200-\377
+NON_ASCII_ESCAPE = regex.compile(r'(?<!\\)(?:\\\\)*\\(?:x[89a-fA-F]|x\{|[uUN]|[23][0-7]{2})')
+
+
+def compile_bytes(pattern, flags=0):
+    '''
+    :return: the pattern compiled for bytes, with ASCII classes like \\w and
+    ., or None when it has to run on decoded text: a non ASCII pattern
+    would match single bytes of a multi byte character, and some patterns,
+    e.g. (?u)abc, do not compile for bytes at all
+    '''
+    if not pattern.isascii() or NON_ASCII_ESCAPE.search(pattern):
+        return None
+    try:
+        return regex.compile(pattern.encode(ENCODING), flags & ~regex.UNICODE)
+    except (regex.error, ValueError):
+        return None
+
 
 class RegexMatch(ActionBaseClass):
-    def __init__(self, name, regex):
+    SIDE_EFFECT_FREE = True
+
+    def __init__(self, name, pattern, field=None, target=TEXT_TARGET):
+        '''
+        :param field: dotted path of the record field to match, e.g.
+        http.request.uri, for inputs that are mappings
+        :param target: TEXT_TARGET or BYTES_TARGET.  A text symbol decodes
+        bytes-like input and matches the text.  A bytes symbol matches
+        bytes-like input in place with a bytes version of its pattern, see
+        compile_bytes, and decodes it too when there is none.  Either kind
+        matches str input with the str pattern.
+        '''
         super(RegexMatch, self).__init__()
+        if target not in TARGETS:
+            raise Exception("Unknown target {} for {}, expected one of: {}".format(target, name, TARGETS))
         self._name = name
-        self.regex = regex.compile(regex)
+        self.pattern = pattern
+        self.target = target
+        self.regex = regex.compile(pattern)
+        # any match must contain this literal, checked before the regex runs
+        self.literal = required_literal(pattern)
+        self.bytes_regex = None
+        self.bytes_literal = None
+        self.literal_search = None
+        if target == BYTES_TARGET:
+            self.bytes_regex = compile_bytes(pattern, self.regex.flags)
+        if self.bytes_regex is not None and self.literal is not None:
+            self.bytes_literal = self.literal.encode(ENCODING)
+            # memoryview and mmap have no substring test
+            self.literal_search = regex.compile(regex.escape(self.bytes_literal)).search
+        self.field = FieldPath(field) if field is not None else None
         self.register_class(str, self.match_string)
+        for klass in BYTES_TYPES:
+            self.register_class(klass, self.match_bytes)
+        if self.field is not None:
+            self.register_class(Mapping, self.match_field)
+
+    @classmethod
+    def from_config(cls, name, spec):
+        '''
+        :param spec: a pattern, or a table with a pattern and an optional
+        field and target
+        '''
+        if isinstance(spec, Mapping):
+            return cls(name, spec['pattern'], field=spec.get('field'), target=spec.get('target', TEXT_TARGET))
+        return cls(name, spec)
+
+    @classmethod
+    def normalize_spec(cls, spec):
+        '''
+        :param spec: a config spec, see from_config
+        :return: the spec config_spec returns for it, without compiling it
+        '''
+        if not isinstance(spec, Mapping):
+            return spec
+        return cls.build_spec(spec['pattern'], spec.get('field'), spec.get('target', TEXT_TARGET))
+
+    @classmethod
+    def build_spec(cls, pattern, field=None, target=TEXT_TARGET):
+        if field is None and target == TEXT_TARGET:
+            return pattern
+        spec = {'pattern': pattern}
+        if field is not None:
+            spec['field'] = field
+        if target != TEXT_TARGET:
+            spec['target'] = target
+        return spec
+
+    def config_spec(self):
+        return self.build_spec(self.pattern, self.field.path if self.field is not None else None, self.target)
 
     @property
     def name(self):
         return self._name
 
     def match_string(self, input_string):
+        if self.literal is not None and self.literal not in input_string:
+            return None
         return self.regex.match(input_string)
 
+    def match_bytes(self, data):
+        if self.bytes_regex is None:
+            return self.match_string(str(data, ENCODING, 'replace'))
+        if self.bytes_literal is not None:
+            if type(data) in (bytes, bytearray):
+                if self.bytes_literal not in data:
+                    return None
+            elif not self.literal_search(data):
+                return None
+        return self.bytes_regex.match(data)
+
+    def match_field(self, record):
+        value = self.field.get(record)
+        if value is MISSING or value is None or isinstance(value, Mapping):
+            return None
+        if isinstance(value, str):
+            return self.match_string(value)
+        return self.match(value)
+
     def match_default(self, obj):
         return self.regex.match(str(obj))
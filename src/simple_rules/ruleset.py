@@ -0,0 +1,180 @@
+from .consts import *
+from .config import Config
+from .process import Rule
+from .batch import execute_many, PROCESS_BACKEND
+from .regex import RegexMatch, BYTES_TYPES
+from .prefilter import LiteralPrefilter
+
+
+class SymbolMatcher(object):
+    '''
+    Matches a list of (bit, RegexMatch) symbols against one kind of input,
+    str or bytes-like, and returns the bitmap of the symbols that match.
+    With the prefilter enabled, symbols that have a required literal only
+    run when one multi-literal scan finds their literal in the input.
+    '''
+
+    def __init__(self, symbols, prefilter=False, data=False):
+        '''
+        :param symbols: list of (bit, RegexMatch) without a field
+        :param data: match bytes-like inputs with the bytes patterns of
+        BYTES_TARGET symbols instead of str inputs
+        '''
+        self.prefilter = None
+        unfiltered = symbols
+        if prefilter:
+            literal = (lambda action: action.bytes_literal) if data else (lambda action: action.literal)
+            pattern = (lambda action: action.bytes_regex) if data else (lambda action: action.regex)
+            self.prefilter = LiteralPrefilter([(literal(action), (bit, pattern(action).match))
+                                               for bit, action in symbols if literal(action) is not None])
+            unfiltered = [(bit, action) for bit, action in symbols if literal(action) is None]
+        # bound once, inputs skip the type dispatch of ActionBaseClass.match
+        self.matchers = [(bit, action.match_bytes if data else action.match_string) for bit, action in unfiltered]
+
+    def match(self, input):
+        bitmap = 0
+        for bit, match in self.matchers:
+            if match(input):
+                bitmap |= bit
+        if self.prefilter is not None:
+            for bit, match in self.prefilter.candidates(input):
+                if match(input):
+                    bitmap |= bit
+        return bitmap
+
+
+class RuleSet(object):
+    '''
+    Evaluates many rules over a shared symbol table.  Every symbol is
+    matched against an input once, producing a bitmap (bit i set when
+    symbol i matches), and each rule's predicate tree is then resolved from
+    that bitmap instead of running its own regexes, so a symbol shared by
+    many rules runs once per input.  Each symbol runs its own regex behind
+    its required literal check: folding the patterns into one regex of
+    lookaheads still rescans the input once per symbol and measured slower,
+    see benchmarks/symbol_bench.py.  With the prefilter enabled, symbols
+    that have a required literal only run when one multi-literal scan finds
+    their literal in the input.  Bytes-like inputs are decoded for
+    TEXT_TARGET symbols and matched in place by BYTES_TARGET symbols.
+    '''
+
+    def __init__(self, symbols, rules=None, prefilter=False):
+        '''
+        :param symbols: dict of symbol name to regular expression, or to a
+        table with a pattern and a field, see RegexMatch.from_config
+        :param rules: list of Rule objects built against these symbols
+        :param prefilter: skip symbols whose required literal is absent
+        '''
+        self.symbols = dict(symbols)
+        self.use_prefilter = prefilter
+        self.names = list(self.symbols.keys())
+        self.bits = {name: 1 << pos for pos, name in enumerate(self.names)}
+        self.sym_maps = {name: RegexMatch.from_config(name, spec) for name, spec in self.symbols.items()}
+        # field symbols match their field of a record, never the whole input text
+        self.fields = [(self.bits[name], action) for name, action in self.sym_maps.items() if action.field is not None]
+        text_symbols = [(self.bits[name], action) for name, action in self.sym_maps.items() if action.field is None]
+        # str inputs: every text symbol runs its str pattern
+        self.string_matcher = SymbolMatcher(text_symbols, prefilter)
+        self.prefilter = self.string_matcher.prefilter
+        # bytes-like inputs: text-target symbols match the decoded text,
+        # bytes-target symbols with a bytes pattern match the bytes in place
+        raw = [(bit, action) for bit, action in text_symbols if action.bytes_regex is not None]
+        decoded = [(bit, action) for bit, action in text_symbols if action.bytes_regex is None]
+        self.decoded_matcher = self.string_matcher
+        self.bytes_matcher = None
+        if len(raw) > 0:
+            self.decoded_matcher = SymbolMatcher(decoded, prefilter) if len(decoded) > 0 else None
+            self.bytes_matcher = SymbolMatcher(raw, prefilter, data=True)
+        self.needs_text = len(text_symbols) > 0
+        self.targets_bytes = len(self.sym_maps) > 0 and all(
+            action.target == BYTES_TARGET for action in self.sym_maps.values())
+        self.rules = []
+        self.compiled_rules = []
+        for rule in rules if rules is not None else []:
+            self.add_rule(rule)
+
+    @classmethod
+    def from_config(cls, rules=None, config=Config, prefilter=False, chain=None):
+        '''
+        :param chain: also add the rule strings of this config chain, e.g. MATCH_CHAIN
+        '''
+        ruleset = cls(config.CONFIG.get(REGEX_RULES, {}), rules, prefilter=prefilter)
+        for name, rule_string in config.CONFIG.get(chain, {}).items():
+            if ruleset.add_rule_string(name, rule_string) is None:
+                raise Exception("Rule {} references unknown symbols: {}".format(name, rule_string))
+        return ruleset
+
+    def __getstate__(self):
+        # compiled regexes and generated functions are rebuilt on unpickling
+        return {'symbols': self.symbols, 'rules': self.rules, 'prefilter': self.use_prefilter}
+
+    def __setstate__(self, state):
+        self.__init__(state['symbols'], state['rules'], prefilter=state['prefilter'])
+
+    def add_rule(self, rule):
+        self.rules.append(rule)
+        self.compiled_rules.append((rule.name, rule.compile_function(self.resolve_action)))
+
+    def compile(self):
+        self.compiled_rules = [(rule.name, rule.compile_function(self.resolve_action)) for rule in self.rules]
+
+    def add_rule_string(self, name, rule_string):
+        rule = Rule.from_token_string(name, rule_string, self.sym_maps)
+        if rule is None:
+            return None
+        self.add_rule(rule)
+        return rule
+
+    def resolve_action(self, node):
+        bit = self.bits.get(getattr(node, 'name', None), None)
+        if bit is None or not isinstance(node, RegexMatch) or self.sym_maps[node.name].config_spec() != node.config_spec():
+            # not one of our symbols, let it run on its own
+            return lambda input, state, execute=node.execute: execute(input)
+        return lambda input, state, bit=bit: state & bit
+
+    def match_symbols(self, input):
+        '''
+        :param input: input string, bytes-like input or record
+        :return: bitmap of the symbols that match the input
+        '''
+        bitmap = 0
+        for bit, action in self.fields:
+            if action.match(input):
+                bitmap |= bit
+        if not self.needs_text:
+            return bitmap
+        if isinstance(input, BYTES_TYPES):
+            if self.bytes_matcher is not None:
+                bitmap |= self.bytes_matcher.match(input)
+            if self.decoded_matcher is not None:
+                bitmap |= self.decoded_matcher.match(str(input, ENCODING, 'replace'))
+            return bitmap
+        if not isinstance(input, str):
+            input = str(input)
+        return bitmap | self.string_matcher.match(input)
+
+    def symbol_names(self, bitmap):
+        return [name for name in self.names if bitmap & self.bits[name]]
+
+    def execute(self, input):
+        '''
+        :param input: input string
+        :return: names of the rules that match the input
+        '''
+        return self.execute_bitmap(input, self.match_symbols(input))
+
+    def execute_bitmap(self, input, bitmap):
+        '''
+        :param bitmap: symbol bitmap of the input, see match_symbols
+        :return: names of the rules that match the input
+        '''
+        return [name for name, fn in self.compiled_rules if fn(input, bitmap)]
+
+    evaluate = execute
+
+    def execute_many(self, inputs, workers=None, backend=PROCESS_BACKEND, chunk_size=1000, ordered=True):
+        '''
+        :return: generator of matched rule names for each input, see batch.execute_many
+        '''
+        return execute_many(self, inputs, workers=workers, backend=backend,
+                            chunk_size=chunk_size, ordered=ordered)
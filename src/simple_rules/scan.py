@@ -0,0 +1,159 @@
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import mmap
+import os
+import sys
+
+from .consts import *
+from .config import Config
+from .pipeline import RulePipeline
+from .batch import init_worker, worker_engine
+
+NEWLINE = b'\n'
+DEFAULT_CHUNK_SIZE = 1 << 22
+DEFAULT_ENCODING = 'utf8'
+
+
+def map_file(path):
+    '''
+    :return: read only mmap of the file, None for empty files
+    '''
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def chunk_offsets(mm, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''
+    :return: list of (start, end) byte ranges that end on a line boundary
+    '''
+    offsets = []
+    start = 0
+    size = len(mm)
+    while start < size:
+        end = mm.find(NEWLINE, min(start + chunk_size, size) - 1)
+        end = size if end == -1 else end + 1
+        offsets.append((start, end))
+        start = end
+    return offsets
+
+
+def iter_lines(view, start, end):
+    '''
+    :param view: memoryview over the mapped file
+    :return: generator of (line offset, memoryview of the line without the newline)
+    '''
+    pos = start
+    obj = view.obj
+    while pos < end:
+        nl = obj.find(NEWLINE, pos, end)
+        nl = end if nl == -1 else nl
+        line_end = nl
+        if line_end > pos and view[line_end - 1] == 0x0d:
+            line_end -= 1
+        yield pos, view[pos:line_end]
+        pos = nl + 1
+
+
+def scan_chunk(path, start, end, engine=None, encoding=DEFAULT_ENCODING):
+    '''
+    Scan the lines of one byte range, each worker maps the file itself.
+
+    :return: list of (line offset, rule name)
+    '''
+    engine = engine if engine is not None else worker_engine()
+    execute = engine.execute
+    # engines whose symbols all target bytes match the mapped pages as they are
+    targets_bytes = getattr(engine, 'targets_bytes', False)
+    matches = []
+    mm = map_file(path)
+    if mm is None:
+        return matches
+    try:
+        with memoryview(mm) as view:
+            for offset, line in iter_lines(view, start, end):
+                # released even when the engine raises, or closing the map
+                # would replace its error with a BufferError
+                try:
+                    if targets_bytes:
+                        names = execute(line)
+                    else:
+                        # decodes straight from the mapped pages, no intermediate bytes
+                        names = execute(str(line, encoding, 'replace'))
+                finally:
+                    line.release()
+                for name in names:
+                    matches.append((offset, name))
+    finally:
+        mm.close()
+    return matches
+
+
+def scan_file(path, engine, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, executor=None):
+    '''
+    :return: generator of (line offset, rule name) in file order
+    '''
+    mm = map_file(path)
+    if mm is None:
+        return
+    try:
+        offsets = chunk_offsets(mm, chunk_size)
+    finally:
+        mm.close()
+
+    if executor is None:
+        engine.compile()
+        for start, end in offsets:
+            for match in scan_chunk(path, start, end, engine):
+                yield match
+        return
+
+    # bound the chunks in flight so memory stays flat for huge files
+    pending = deque()
+    for start, end in offsets:
+        pending.append(executor.submit(scan_chunk, path, start, end))
+        if len(pending) >= workers * 2:
+            for match in pending.popleft().result():
+                yield match
+    while len(pending) > 0:
+        for match in pending.popleft().result():
+            yield match
+
+
+def scan_files(paths, engine, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''
+    :return: generator of (path, line offset, rule name)
+    '''
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(engine,))
+    try:
+        for path in paths:
+            for offset, name in scan_file(path, engine, workers, chunk_size, executor):
+                yield path, offset, name
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scan files line by line, dropping ignored lines and reporting match-chain rules')
+    parser.add_argument('config', help='TOML rule config')
+    parser.add_argument('files', nargs='+', help='files to scan')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='worker processes')
+    parser.add_argument('-c', '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='bytes per worker chunk')
+    parser.add_argument('--prefilter', action='store_true', help='enable the literal prefilter')
+    args = parser.parse_args(argv)
+
+    Config.parse_config(args.config)
+    engine = RulePipeline.from_config(prefilter=args.prefilter)
+    out = sys.stdout
+    for path, offset, name in scan_files(args.files, engine, args.workers, args.chunk_size):
+        out.write("{}:{}:{}\n".format(path, offset, name))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
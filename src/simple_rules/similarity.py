@@ -1,3 +1,12 @@
+import heapq
+import json
+from collections import Counter, defaultdict
+
+from .consts import *
+from .contrib import levenshtein
+from .vectors import BaseVectorOp
+
+
 class WordSimilarity(object):
 
     def __init__(self, word):
@@ -26,3 +35,121 @@ class WordSimilarity(object):
 
     def filter(self, phrase, chars=ASCII_CHARS):
         return "".join([i for i in phrase if i in chars])
+
+
+class FuzzyWordIndex(object):
+    '''
+    N-gram inverted index over a dictionary of target words.  Queries only
+    look at words that share grams with the query and verify those
+    candidates, instead of comparing against the whole dictionary.
+    '''
+    PAD = '\x00'
+
+    def __init__(self, words=None, gram_size=2):
+        self.gram_size = gram_size
+        self.words = []
+        self.ids = {}
+        # gram -> list of ids of the words containing it
+        self.postings = defaultdict(list)
+        # gram -> {word id: occurrences} for words containing it more than once
+        self.repeats = defaultdict(dict)
+        self.lengths = defaultdict(list)
+        for word in words if words is not None else []:
+            self.add(word)
+
+    def grams(self, word):
+        pad = self.PAD * (self.gram_size - 1)
+        padded = pad + word + pad
+        return Counter(padded[i:i + self.gram_size] for i in range(len(padded) - self.gram_size + 1))
+
+    def add(self, word):
+        if word in self.ids:
+            return self.ids[word]
+        num = len(self.words)
+        self.words.append(word)
+        self.ids[word] = num
+        self.lengths[len(word)].append(num)
+        for gram, count in self.grams(word).items():
+            self.postings[gram].append(num)
+            if count > 1:
+                self.repeats[gram][num] = count
+        return num
+
+    def shared_grams(self, word):
+        '''
+        :return: dict of word id to the number of grams shared with word
+        '''
+        shared = Counter()
+        for gram, count in self.grams(word).items():
+            # counted in C, one per word containing the gram
+            shared.update(self.postings.get(gram, ()))
+            if count > 1:
+                for num, other in self.repeats.get(gram, {}).items():
+                    shared[num] += min(count, other) - 1
+        return shared
+
+    def within(self, word, max_distance):
+        '''
+        :param word: query word
+        :param max_distance: maximum edit distance
+        :return: list of (target word, distance) closest first
+        '''
+        shared = self.shared_grams(word)
+        candidates = set()
+        required = {}
+        for length in range(max(len(word) - max_distance, 0), len(word) + max_distance + 1):
+            # one edit destroys at most gram_size grams (count filtering)
+            required[length] = max(len(word), length) + self.gram_size - 1 - max_distance * self.gram_size
+            if required[length] <= 0:
+                # a word this short may share no gram with the query
+                candidates.update(self.lengths.get(length, ()))
+        words = self.words
+        least = max(min(required.values()), 1)
+        candidates.update(num for num, count in shared.items()
+                          if count >= least and count >= required.get(len(words[num]), count + 1))
+
+        results = []
+        for num in candidates:
+            distance = levenshtein(word, self.words[num], max_distance=max_distance)
+            if distance <= max_distance:
+                results.append((self.words[num], distance))
+        return sorted(results, key=lambda r: (r[1], r[0]))
+
+    def top_k(self, word, k, fn=BaseVectorOp.jaro_winkler_distance, min_shared=None):
+        '''
+        Score the words sharing enough grams with the query.
+
+        :param fn: similarity function(input, target), higher is closer
+        :param min_shared: grams a word must share with the query to be
+        scored, by default half of the query's grams
+        :return: list of (target word, score) best first
+        '''
+        if min_shared is None:
+            min_shared = max(1, (len(word) + self.gram_size) // 2)
+        words = self.words
+        scored = ((words[num], fn(word, words[num])) for num, count in self.shared_grams(word).items()
+                  if count >= min_shared)
+        return heapq.nsmallest(k, scored, key=lambda r: (-r[1], r[0]))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf8') as f:
+            json.dump({'gram_size': self.gram_size, 'words': self.words, 'postings': self.postings,
+                       'repeats': {gram: list(counts.items()) for gram, counts in self.repeats.items()}}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or not isinstance(data.get('gram_size'), int) or \
+                not isinstance(data.get('words'), list) or not isinstance(data.get('postings'), dict) or \
+                not isinstance(data.get('repeats'), dict):
+            raise Exception("Invalid word index: {}".format(path))
+        index = cls(gram_size=data['gram_size'])
+        index.words = data['words']
+        index.ids = {word: num for num, word in enumerate(index.words)}
+        index.postings = defaultdict(list, data['postings'])
+        index.repeats = defaultdict(dict, {gram: {num: count for num, count in counts}
+                                           for gram, counts in data['repeats'].items()})
+        for num, word in enumerate(index.words):
+            index.lengths[len(word)].append(num)
+        return index
@@ -1,12 +1,18 @@
+import itertools
+import weakref
+
 from .consts import *
 from .parser import AndOp
 
 class Predicate(object):
+    __slots__ = ('num', 'parent', 'members', 'users', '__weakref__')
     TYPE = PREDICATE
     def __init__(self, num, parent=None):
         self.num = num
         self.parent = parent
         self.members = []
+        # rule groups interned as this node, see PredicateTable
+        self.users = 1
 
     def add_member(self, token):
         self.members.append(token)
@@ -36,6 +42,77 @@ class Predicate(object):
         return "{}".format(" ".join(r))
 
 
+class PredicateTable(object):
+    '''
+    Hash-consing table for predicate groups.  Structurally equal groups,
+    same actions (by identity), same operators and same interned child
+    groups, become one shared Predicate with an immutable members tuple and
+    a process wide group number, so rules built from the same config share
+    their common sub-predicates.  Entries live as long as a rule holds them,
+    and a group's users count the live rules holding it, see hold.
+    '''
+    TABLE = weakref.WeakValueDictionary()
+    NUMS = itertools.count(1)
+
+    @classmethod
+    def key(cls, members):
+        key = []
+        for node in members:
+            if node.TYPE == PREDICATE:
+                key.append((PREDICATE, node.num))
+            elif node.TYPE in (AND, OR):
+                key.append((node.TYPE,))
+            else:
+                key.append((node.TYPE, id(node)))
+        return tuple(key)
+
+    @classmethod
+    def intern(cls, members):
+        '''
+        :param members: group members, child groups already interned
+        :return: the shared Predicate for these members
+        '''
+        key = cls.key(members)
+        group = cls.TABLE.get(key)
+        if group is not None:
+            group.users += 1
+            return group
+        group = Predicate(next(cls.NUMS))
+        group.members = tuple(members)
+        cls.TABLE[key] = group
+        return group
+
+    @classmethod
+    def hold(cls, owner, groups):
+        '''
+        :param owner: the rule the groups were interned for, its groups
+        lose it as a user once it is garbage collected
+        :param groups: the groups returned by intern for the owner
+        '''
+        weakref.finalize(owner, cls.release, list(groups))
+
+    @classmethod
+    def release(cls, groups):
+        for group in groups:
+            group.users -= 1
+
+
+class ValidationError(Exception):
+    '''
+    Raised when a token stream is not a valid rule.
+
+    offset: source offset of the offending token, -1 when not known
+    token: the offending token, if any
+    expected: token types that would have been accepted at that point
+    '''
+
+    def __init__(self, message, offset=-1, token=None, expected=()):
+        super(ValidationError, self).__init__(message)
+        self.offset = offset
+        self.token = token
+        self.expected = frozenset(expected)
+
+
 class TokenStreamValidator(object):
     STATE_MACHINE = {
         SYMBOL: SYMBOL_NEXT,
@@ -51,18 +128,20 @@ class TokenStreamValidator(object):
         self.pos = 0
         self.groups = {}
         self.group_stack = []
+        # ENTER_GROUP token of every open group, for error offsets
+        self.open_tokens = []
 
         self.last_group = 0
         self.current_group = Predicate(self.last_group, None)
         self.main_group = self.current_group
-        self.group_stack.insert(0, self.current_group)
+        self.group_stack.append(self.current_group)
         self.groups[self.last_group] = self.main_group
 
         self.token_stream = [i for i in self.old_token_stream if i.TYPE != SPACE]
 
         self.sym_maps = sym_maps
 
-    def enter_group(self):
+    def enter_group(self, token=None):
         self.last_group += 1
         parent = self.current_group
         num = self.last_group
@@ -70,65 +149,66 @@ class TokenStreamValidator(object):
         if self.current_group is not None:
             self.current_group.add_member(new_group)
 
-        self.group_stack.insert(0, self.current_group)
+        self.group_stack.append(self.current_group)
+        self.open_tokens.append(token)
         self.current_group = new_group
         self.groups[num] = new_group
 
     def add_group_member(self, token):
         self.current_group.add_member(token)
 
-    def exit_group(self):
-        if len(self.group_stack) > 0:
-            self.current_group = self.group_stack.pop(0)
+    def exit_group(self, token=None):
+        if len(self.group_stack) <= 1:
+            raise ValidationError("Unbalanced grouping for the rule, unexpected {} at offset {}".format(
+                token, getattr(token, 'offset', -1)), getattr(token, 'offset', -1), token)
+        self.current_group = self.group_stack.pop()
+        self.open_tokens.pop()
+
+    def check_transition(self, token, next_token):
+        next_state = self.STATE_MACHINE[token.TYPE]
+        if next_token.TYPE != SPACE and next_token.TYPE not in next_state:
+            raise ValidationError("Failed validation for {}, unexpected {} at offset {}, expected: {}".format(
+                token, next_token, next_token.offset, next_state), next_token.offset, next_token, next_state)
+
+    def process_token(self, token):
+        if token.TYPE == SPACE:
+            return
+        elif token.TYPE == ENTER_GROUP:
+            self.enter_group(token)
+        elif token.TYPE == EXIT_GROUP:
+            self.exit_group(token)
         else:
-            self.current_group = None
+            self.add_group_member(token)
 
     def validate_without_symbols(self):
-        pos = 0
-        # Rewriting changes stream length, need to be dynamic
-        # end = len(self.token_stream)
-
-        while pos < len(self.token_stream)-1:
-            t = self.token_stream[pos]
-            n = self.token_stream[pos+1]
-            next_state = self.STATE_MACHINE[t.TYPE]
-
-            # Rewriting token stream, and injecting implicit AND
-            if t.TYPE == SYMBOL and n.TYPE == ENTER_GROUP:
-                self.token_stream.insert(pos+1, AndOp())
-                n = self.token_stream[pos+1]
-
-
-            if n.TYPE != SPACE and n.TYPE not in next_state:
-                print ("Current: ", t, "Next: ",n)
-                raise Exception("Failed validation for {}, expected: {}".format(t, next_state))
-
-            pos += 1
-            if t.TYPE == SPACE:
-                continue
+        '''
+        One forward pass over the token stream, checking each transition,
+        building the predicate groups and a new token stream with the
+        implicit AND between a symbol and a following group.
+        '''
+        tokens = self.token_stream
+        output = []
+        last = len(tokens) - 1
+        for pos, t in enumerate(tokens):
+            if pos < last:
+                n = tokens[pos + 1]
+                if t.TYPE == SYMBOL and n.TYPE == ENTER_GROUP:
+                    self.process_token(t)
+                    output.append(t)
+                    t = AndOp(offset=n.offset)
+                self.check_transition(t, n)
             elif t.TYPE == ENTER_GROUP:
-                self.enter_group()
-            elif t.TYPE == EXIT_GROUP:
-                self.exit_group()
-            else:
-                self.add_group_member(t)
-
-        # process last token
-        t = self.token_stream[-1]
-        pos += 1
-        if t.TYPE == SPACE:
-            pass
-        elif t.TYPE == ENTER_GROUP:
-            raise Exception("Unexpected grouping at the end of the stream")
-        elif t.TYPE == EXIT_GROUP:
-            self.exit_group()
-        else:
-            self.add_group_member(t)
+                raise ValidationError("Unexpected grouping at the end of the stream", t.offset, t, ())
+            self.process_token(t)
+            output.append(t)
+        self.token_stream = output
 
         if len(self.group_stack) != 1:
-            raise Exception("Unbalanced grouping for the rule")
+            token = self.open_tokens[-1]
+            raise ValidationError("Unbalanced grouping for the rule, {} at offset {} is never closed".format(
+                token, token.offset), token.offset, token, [EXIT_GROUP])
         if self.main_group.count() == 0:
-            raise Exception("Empty rule")
+            raise ValidationError("Empty rule")
         return True
 
     def validate_with_symbols(self, sym_maps={}):
@@ -138,8 +218,7 @@ class TokenStreamValidator(object):
         for num, group in self.groups.items():
             failed_groups[num] = []
             for t in group.get_members():
-                v = t.get_value()
-                if t.TYPE == SYMBOL and v not in sym_maps:
-                    failed_groups[num].append(v)
+                if t.TYPE == SYMBOL and t.get_value() not in sym_maps:
+                    failed_groups[num].append(t.get_value())
                     failed = True
         return failed, failed_groups
@@ -1,9 +1,18 @@
+import heapq
+import math
 import jellyfish
+from collections import Counter
 from itertools import permutations
 import numpy as np
 
 from .contrib import levenshtein
 
+# newer jellyfish releases renamed the jaro functions
+jaro_similarity = getattr(jellyfish, 'jaro_similarity', None) or jellyfish.jaro_distance
+jaro_winkler_similarity = getattr(jellyfish, 'jaro_winkler_similarity', None) or jellyfish.jaro_winkler
+
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
 
 class BaseVectorOp(object):
 
@@ -18,38 +27,78 @@ class BaseVectorOp(object):
 
         pos = 0
         sub_strings = []
-        while pos < len(input) - max_sz:
+        while pos <= len(input) - max_sz:
             sub_strings.append(input[pos:pos + max_sz])
             pos += 1
         return sub_strings
 
+    @classmethod
+    def code_points(cls, string: str) -> np.ndarray:
+        '''
+        :param string: input string
+        :return: unicode code point per character
+        '''
+        return np.frombuffer(string.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+
+    @classmethod
+    def build_count_matrix(cls, strings: list, letters: list = None) -> (list, np.ndarray):
+        '''
+        Count the letters of every string in one pass over the concatenated code points.
+
+        :param strings: input strings, one row each
+        :param letters: letters used as the columns, otherwise the sorted union of letters in strings
+        :return: letters and a len(strings) x len(letters) matrix of counts, letters
+        outside the alphabet are not counted
+        '''
+        strings = list(strings)
+        codes = cls.code_points("".join(strings))
+        if letters is None:
+            letter_codes = np.unique(codes)
+            letters = [chr(c) for c in letter_codes]
+            columns = np.searchsorted(letter_codes, codes)
+            known = np.ones(codes.size, dtype=bool)
+        else:
+            letter_codes = cls.code_points("".join(letters))
+            order = np.argsort(letter_codes, kind='stable')
+            sorted_codes = letter_codes[order]
+            pos = np.minimum(np.searchsorted(sorted_codes, codes), max(sorted_codes.size - 1, 0))
+            if sorted_codes.size == 0:
+                known = np.zeros(codes.size, dtype=bool)
+                columns = pos
+            else:
+                known = sorted_codes[pos] == codes
+                columns = order[pos]
+
+        rows = np.repeat(np.arange(len(strings)), [len(i) for i in strings])
+        width = len(letters)
+        flat = rows[known] * width + columns[known]
+        counts = np.bincount(flat, minlength=len(strings) * width)
+        return letters, counts.reshape(len(strings), width)
+
     @classmethod
     def build_vector(cls, string: str, letters: list = None) -> (list, np.ndarray):
         '''
 
         :param string: input string to build the counted vector for using letters, if not None
         :param letters: letters used to construct the sorted vector, otherwise letters are derived from string
-        :return: frequency of letter occurrences for ML/stats
+        :return: frequency of letter occurrences for ML/stats, letters outside
+        the alphabet are not counted
         '''
-        letters = letters if letters is not None else sorted(set(string))
-        vector = {k: 0 for k in letters}
-        for l in string:
-            vector[l] += 1
-        return letters, np.array([vector[l] for l in letters])
+        # one short string is cheaper to count in Python, batches go through build_count_matrix
+        counts = Counter(string)
+        letters = letters if letters is not None else sorted(counts)
+        return letters, np.array([counts[l] for l in letters], dtype=np.int64)
 
     @classmethod
-    def build_vectors(cls, strings: list, letters: list) -> list:
+    def build_vectors(cls, strings: list, letters: list) -> np.ndarray:
         '''
 
         :param string: input string to build the counted vector for using letters, if not None
         :param letters: letters used to construct the sorted vector, otherwise letters are derived from string
-        :return: frequency of letter occurrences for ML/stats
+        :return: frequency of letter occurrences for ML/stats, one row per string
         '''
-        result = []
-        for string in strings:
-            _, vec = cls.build_vector(string, letters)
-            result.append(vec)
-        return result
+        _, counts = cls.build_count_matrix(strings, letters)
+        return counts
 
     @classmethod
     def calculate_levenshtein(cls, input: str, target: str) -> float:
@@ -74,11 +123,75 @@ class BaseVectorOp(object):
 
     @classmethod
     def build_substring_vectors(cls, substrings: list, letters: list) -> np.ndarray:
-        vecs = np.array()
-        for substring in substrings:
-            _, vec = cls.build_vector(substring, letters)
-            vecs = np.vstack([vecs, vec])
-        return vecs
+        _, counts = cls.build_count_matrix(substrings, letters)
+        return counts
+
+    @classmethod
+    def build_window_vectors(cls, input: str, size: int, letters: list) -> np.ndarray:
+        '''
+        Letter counts of every window of build_substrings(input, size), each
+        window is the previous one plus the incoming letter minus the
+        outgoing letter, computed for all windows at once as a difference of
+        running counts.
+
+        :return: (len(input) - size + 1) x len(letters) matrix of counts
+        '''
+        windows = len(input) - size + 1
+        if windows <= 0 or size <= 0:
+            return np.zeros((max(windows, 0), len(letters)), dtype=np.int64)
+        _, per_letter = cls.build_count_matrix(input, letters)
+        running = np.zeros((len(input) + 1, len(letters)), dtype=np.int64)
+        np.cumsum(per_letter, axis=0, out=running[1:])
+        return running[size:] - running[:windows]
+
+    @classmethod
+    def score_windows(cls, window_vectors: np.ndarray, target_vector: np.ndarray, name: str = 'cosine') -> np.ndarray:
+        '''
+        :param name: 'cosine' (cosine_similarity) or 'jaccard' (jaccard_distance)
+        :return: score of every window against the target
+        '''
+        if name == 'cosine':
+            norms = np.linalg.norm(window_vectors, axis=1) * np.linalg.norm(target_vector)
+            dots = window_vectors @ target_vector
+            return np.divide(dots, norms, out=np.zeros(len(window_vectors)), where=norms > 0)
+        elif name == 'jaccard':
+            present = (window_vectors > 0).astype(np.int64)
+            overlap = present @ (target_vector > 0).astype(np.int64)
+            sizes = present.sum(axis=1)
+            return np.divide(overlap, sizes, out=np.zeros(len(window_vectors)), where=sizes > 0)
+        raise Exception("Unknown similarity {}, expected: cosine or jaccard".format(name))
+
+    @classmethod
+    def iter_window_scores(cls, input: str, target: str, name: str = 'cosine', chunk_size: int = 4096):
+        '''
+        Score the windows of input against target a chunk of windows at a
+        time, so memory stays bounded for long inputs.  Each chunk only
+        counts the letters that occur in it or in the target, the others are
+        zero in every window of the chunk.
+
+        :return: generator of (offset of the first window, scores of the chunk's windows)
+        '''
+        size = len(target)
+        for start in range(0, len(input) - size + 1, chunk_size):
+            piece = input[start:start + chunk_size + size - 1]
+            letters = sorted(set(piece) | set(target))
+            yield start, cls.score_windows(cls.build_window_vectors(piece, size, letters),
+                                           cls.build_vector(target, letters)[1], name)
+
+    @classmethod
+    def best_window(cls, input: str, target: str, name: str = 'cosine', chunk_size: int = 4096) -> (int, float):
+        '''
+        :return: offset and score of the window of input that best matches target, None
+        if target is longer than input
+        '''
+        best = None
+        for start, scores in cls.iter_window_scores(input, target, name, chunk_size):
+            if len(scores) == 0:
+                continue
+            offset = int(np.argmax(scores))
+            if best is None or scores[offset] > best[1]:
+                best = (start + offset, float(scores[offset]))
+        return best
 
     @classmethod
     def union(cls, strings:list=None) -> set:
@@ -120,7 +233,7 @@ class BaseVectorOp(object):
 
     @classmethod
     def jaro_distance(cls, input: str, target:str) -> float:
-        return jellyfish.jaro_distance(input, target)
+        return jaro_similarity(input, target)
 
     @classmethod
     def jaro_distances(cls, inputs: list, target:str) -> list:
@@ -128,7 +241,7 @@ class BaseVectorOp(object):
 
     @classmethod
     def jaro_winkler_distance(cls, input: str, target:str) -> float:
-        return jellyfish.jaro_winkler(input, target)
+        return jaro_winkler_similarity(input, target)
 
     @classmethod
     def jaro_winkler_distances(cls, inputs: list, target:str) -> list:
@@ -149,6 +262,105 @@ class BaseVectorOp(object):
         mlen = max(len(input), len(target))
         return 1 - float(distance / mlen)
 
+    @classmethod
+    def levenshtein_within(cls, input: str, target: str, max_distance: int) -> bool:
+        return levenshtein(input, target, max_distance=max_distance) <= max_distance
+
+    @classmethod
+    def normalized_rows(cls, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @classmethod
+    def popcount(cls, packed: np.ndarray) -> np.ndarray:
+        '''
+        :param packed: uint8 array
+        :return: number of set bits, summed over the last axis
+        '''
+        if hasattr(np, 'bitwise_count'):
+            return np.bitwise_count(packed).sum(axis=-1, dtype=np.int64)
+        return POPCOUNT_TABLE[packed].sum(axis=-1, dtype=np.int64)
+
+    @classmethod
+    def iter_similarity_chunks(cls, inputs: list, targets: list, name: str = 'cosine', chunk_size: int = 1024):
+        '''
+        Build the letter vectors of inputs and targets once over a shared alphabet,
+        then score chunks of inputs against every target.
+
+        :param name: 'cosine' (cosine_similarity) or 'jaccard' (jaccard_distance)
+        :param chunk_size: input rows scored at a time
+        :return: generator of (first input index, chunk x len(targets) matrix)
+        '''
+        inputs = list(inputs)
+        targets = list(targets)
+        letters, counts = cls.build_count_matrix(inputs + targets)
+        input_counts, target_counts = counts[:len(inputs)], counts[len(inputs):]
+
+        if name == 'cosine':
+            input_rows = cls.normalized_rows(input_counts)
+            target_rows = cls.normalized_rows(target_counts).T
+            for start in range(0, len(inputs), chunk_size):
+                yield start, input_rows[start:start + chunk_size] @ target_rows
+        elif name == 'jaccard':
+            input_bits = np.packbits(input_counts > 0, axis=1)
+            target_bits = np.packbits(target_counts > 0, axis=1)
+            input_sizes = cls.popcount(input_bits)
+            for start in range(0, len(inputs), chunk_size):
+                chunk = input_bits[start:start + chunk_size]
+                overlap = cls.popcount(chunk[:, None, :] & target_bits[None, :, :])
+                sizes = input_sizes[start:start + chunk_size, None]
+                yield start, np.divide(overlap, sizes, out=np.zeros(overlap.shape), where=sizes > 0)
+        else:
+            raise Exception("Unknown similarity {}, expected: cosine or jaccard".format(name))
+
+    @classmethod
+    def similarity_matrix(cls, inputs: list, targets: list, name: str = 'cosine', chunk_size: int = 1024) -> np.ndarray:
+        '''
+        :return: len(inputs) x len(targets) matrix of scores
+        '''
+        inputs = list(inputs)
+        result = np.zeros((len(inputs), len(targets)))
+        for start, chunk in cls.iter_similarity_chunks(inputs, targets, name, chunk_size):
+            result[start:start + len(chunk)] = chunk
+        return result
+
+    @classmethod
+    def cosine_similarity_matrix(cls, inputs: list, targets: list, chunk_size: int = 1024) -> np.ndarray:
+        return cls.similarity_matrix(inputs, targets, 'cosine', chunk_size)
+
+    @classmethod
+    def jaccard_distance_matrix(cls, inputs: list, targets: list, chunk_size: int = 1024) -> np.ndarray:
+        '''
+        Same measure as jaccard_distance: letters shared with the target over letters in the input.
+        '''
+        return cls.similarity_matrix(inputs, targets, 'jaccard', chunk_size)
+
+    @classmethod
+    def top_k_per_target(cls, inputs: list, targets: list, k: int, name: str = 'cosine', chunk_size: int = 1024) -> list:
+        '''
+        Keep only the k best inputs per target while scoring chunk by chunk.
+
+        :return: per target, a list of (input index, score) best first
+        '''
+        targets = list(targets)
+        best_scores = np.empty((0, len(targets)))
+        best_index = np.empty((0, len(targets)), dtype=np.int64)
+        for start, chunk in cls.iter_similarity_chunks(inputs, targets, name, chunk_size):
+            index = np.broadcast_to(np.arange(start, start + len(chunk))[:, None], chunk.shape)
+            scores = np.vstack([best_scores, chunk])
+            index = np.vstack([best_index, index])
+            if len(scores) > k:
+                keep = np.argpartition(-scores, k - 1, axis=0)[:k]
+                scores = np.take_along_axis(scores, keep, axis=0)
+                index = np.take_along_axis(index, keep, axis=0)
+            best_scores, best_index = scores, index
+
+        order = np.argsort(-best_scores, axis=0, kind='stable')
+        best_scores = np.take_along_axis(best_scores, order, axis=0)
+        best_index = np.take_along_axis(best_index, order, axis=0)
+        return [list(zip(best_index[:, t].tolist(), best_scores[:, t].tolist())) for t in range(len(targets))]
+
 
 class SimpleWordVector(BaseVectorOp):
 
@@ -161,7 +373,7 @@ class SimpleWordVector(BaseVectorOp):
         _, self.target_vector = self.build_vector(self.target, letters=self.letters)
         _, self.input_vector = self.build_vector(self.input, letters=self.letters)
         self.substring = self.build_substrings(input, len(target))
-        self.substring_vectors = self.build_substrings(input, len(target))
+        self.substring_vectors = self.build_window_vectors(input, len(target), self.letters)
 
     def get_result(self, input, target, input_vector, target_vector, fn):
         return {'input': input, 'target': target, 'result': fn(input_vector, target_vector)}
@@ -190,12 +402,25 @@ class SimpleWordVector(BaseVectorOp):
 
     def jacard(self):
         results = []
-        get_result = lambda i, t: {'input': i, 'target':t, 'result': self.jaccard_distance(t, input=i)}
+        get_result = lambda i, t: {'input': i, 'target':t, 'result': self.jaccard_distance(i, t)}
         results.append(get_result(self.input, self.target))
         for ss_value, ss_vector in zip(self.substring, self.substring_vectors):
             results.append(get_result(ss_value, self.target))
         return results
 
+    def window_scores(self, name="cosine"):
+        return self.score_windows(self.substring_vectors, self.target_vector, name)
+
+    def best_substring(self, name="cosine"):
+        '''
+        :return: (offset, substring, score) of the best scoring window, None if target is longer than input
+        '''
+        scores = self.window_scores(name)
+        if len(scores) == 0:
+            return None
+        offset = int(np.argmax(scores))
+        return offset, self.substring[offset], float(scores[offset])
+
 class OrderedWordVectors(SimpleWordVector):
 
     def __init__(self, input, target):
@@ -205,20 +430,29 @@ class OrderedWordVectors(SimpleWordVector):
         '''
         super(OrderedWordVectors, self).__init__(input, target)
 
-        self.substrings = self.build_substrings(input, max_sz=len(self.target))
-        self.substrings_count = np.array()
-        for substring in self.substrings:
-            _, vec = self.build_vector(substring, self.letters)
-            self.substrings_count = np.vstack([self.substrings_count, vec])
+        self.substrings = self.substring
+        self.substrings_count = self.substring_vectors
 
 
 class FlippyWordsVectors(object):
-    def __init__(self, targets: list):
+    def __init__(self, targets: list, lazy: bool = False):
+        '''
+        :param targets: target tokens, candidates are the tokens and their joined permutations
+        :param lazy: do not materialize the permutations, candidates are generated per query
+        '''
         self.targets = targets
-        self.permuted_targets = self.build_target_permutations(targets)
+        self.lazy = lazy
+        self.permuted_targets = None if lazy else self.build_target_permutations(targets)
 
-    def get_orderd_word_vectors(self, input):
-        return {k: OrderedWordVectors(k, input) for k in self.permuted_targets}
+    def get_orderd_word_vectors(self, input, threshold: float = None):
+        '''
+        :param threshold: skip candidates whose similarity to input can not reach this
+        :return: dict of candidate to OrderedWordVectors, a generator of pairs when lazy
+        '''
+        pairs = ((k, OrderedWordVectors(k, input)) for k in self.iter_candidates(input, threshold))
+        if self.lazy:
+            return pairs
+        return dict(pairs)
 
     @classmethod
     def build_target_permutations(cls, targets: list):
@@ -226,3 +460,94 @@ class FlippyWordsVectors(object):
         if len(targets) > 1:
             r = [t for t in targets]
         return r + ["".join(i) for i in permutations(targets)]
+
+    @classmethod
+    def distinct_permutations(cls, tokens: list):
+        '''
+        Lexicographic next permutation over the sorted tokens, repeated tokens
+        do not produce repeated permutations.
+        '''
+        items = sorted(tokens)
+        n = len(items)
+        while True:
+            yield tuple(items)
+            i = n - 2
+            while i >= 0 and items[i] >= items[i + 1]:
+                i -= 1
+            if i < 0:
+                return
+            j = n - 1
+            while items[j] <= items[i]:
+                j -= 1
+            items[i], items[j] = items[j], items[i]
+            items[i + 1:] = reversed(items[i + 1:])
+
+    @classmethod
+    def similarity_bound(cls, candidate: str, input: str) -> float:
+        '''
+        Upper bound of levenshtein_similarity from lengths and letter counts
+        only, the same for every ordering of the candidate's letters.
+        '''
+        mlen = max(len(candidate), len(input))
+        if mlen == 0:
+            return 1.0
+        counts = Counter(candidate)
+        counts.subtract(Counter(input))
+        # a substitution fixes two letter differences, an insert or delete one
+        lower = max(abs(len(candidate) - len(input)), (sum(abs(v) for v in counts.values()) + 1) // 2)
+        return 1 - lower / mlen
+
+    def iter_candidates(self, input: str, threshold: float = None):
+        '''
+        :return: generator of candidates that can reach threshold against input
+        '''
+        if not self.lazy:
+            for candidate in self.permuted_targets:
+                if threshold is None or self.similarity_bound(candidate, input) >= threshold:
+                    yield candidate
+            return
+
+        if len(self.targets) > 1:
+            for t in sorted(set(self.targets)):
+                if threshold is None or self.similarity_bound(t, input) >= threshold:
+                    yield t
+        # every permutation has the same letters, one bound prunes them all
+        if threshold is not None and self.similarity_bound("".join(self.targets), input) < threshold:
+            return
+        for i in self.distinct_permutations(self.targets):
+            yield "".join(i)
+
+    def best_k(self, input: str, k: int, threshold: float = 0.0) -> list:
+        '''
+        Best candidates by levenshtein_similarity without holding the
+        permutation space, the running k-th best score tightens the pruning
+        and the distance cutoff.  Different token orders can join to the
+        same candidate, it is kept once.
+
+        :return: list of (candidate, similarity) best first
+        '''
+        best = []
+        # a repeat of an evicted or pruned candidate can not beat the floor
+        # again, so only the candidates in the heap need checking
+        kept = set()
+        for candidate in self.iter_candidates(input, threshold):
+            if candidate in kept:
+                continue
+            floor = max(threshold, best[0][0]) if len(best) == k else threshold
+            if self.similarity_bound(candidate, input) < floor:
+                continue
+            mlen = max(len(candidate), len(input))
+            if mlen == 0:
+                score = 1.0
+            else:
+                max_distance = int(math.floor((1 - floor) * mlen + 1e-9))
+                score = 1 - levenshtein(candidate, input, max_distance=max_distance) / mlen
+            if score < floor:
+                continue
+            if len(best) < k:
+                heapq.heappush(best, (score, candidate))
+                kept.add(candidate)
+            elif (score, candidate) > best[0]:
+                kept.discard(heapq.heapreplace(best, (score, candidate))[1])
+                kept.add(candidate)
+        return [(candidate, score) for score, candidate in sorted(best, reverse=True)]
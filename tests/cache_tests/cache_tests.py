@@ -0,0 +1,68 @@
+from unittest import TestCase, mock
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+from simple_rules.cache import CompiledRuleCache
+from simple_rules.config import Config
+from simple_rules.consts import *
+from simple_rules.parser import Parser
+
+
+CONFIG = '''
+[simple-rules.regular-expressions]
+adam = ".*adam"
+pridgen = ".*pridgen"
+why = ".*why"
+
+[simple-rules.match-chain]
+name = "adam OR pridgen"
+question = "adam AND (why OR pridgen)"
+'''
+
+
+class TestCompiledRuleCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_path = os.path.join(self.directory, 'rules.toml')
+        with open(self.config_path, 'w') as config_file:
+            config_file.write(CONFIG)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_warm_start_skips_parsing(self):
+        cold = CompiledRuleCache(self.config_path).load_rules()
+        self.assertTrue(os.path.exists(CompiledRuleCache(self.config_path).cache_path))
+        with mock.patch.object(Parser, 'parse_string', side_effect=AssertionError):
+            warm = CompiledRuleCache(self.config_path).load_rules()
+        for i in ['adam', 'pridgen', 'adam why', 'why']:
+            self.assertEqual([bool(r.execute(i)) for r in warm.values()],
+                             [bool(r.execute(i)) for r in cold.values()], i)
+        self.assertEqual(Config.CONFIG[REGEX_RULES]['why'], '.*why')
+
+    def test_content_change_invalidates(self):
+        cache_dir = os.path.join(self.directory, 'cache')
+        os.mkdir(cache_dir)
+        CompiledRuleCache(self.config_path, cache_dir).load_rules()
+        with open(self.config_path, 'a') as config_file:
+            config_file.write('only_why = "why"\n')
+        rules = CompiledRuleCache(self.config_path, cache_dir).load_rules()
+        self.assertIn('only_why', rules)
+
+    def test_cache_is_json(self):
+        CompiledRuleCache(self.config_path).load_rules()
+        with open(CompiledRuleCache(self.config_path).cache_path) as cache_file:
+            cached = json.load(cache_file)
+        self.assertEqual(set(cached), {'key', 'config', 'chains'})
+
+    def test_untrusted_cache_not_unpickled(self):
+        cache_path = CompiledRuleCache(self.config_path).cache_path
+        with open(cache_path, 'wb') as cache_file:
+            pickle.dump(mock.sentinel, cache_file)
+        with mock.patch.object(pickle, 'load', side_effect=AssertionError):
+            rules = CompiledRuleCache(self.config_path).load_rules()
+        self.assertEqual(sorted(rules), ['name', 'question'])
@@ -2,6 +2,13 @@ import unittest
 import os
 import signal
 
+from parse_tests.parse_tests import *
+from process_tests.process_tests import *
+from cache_tests.cache_tests import *
+from scan_tests.scan_tests import *
+from vector_tests.vector_tests import *
+from reload_tests.reload_tests import *
+
 if __name__ == '__main__':
 
     unittest.main()
@@ -1,5 +1,7 @@
 from unittest import TestCase
 from simple_rules.consts import *
+from simple_rules.parser import Parser
+from simple_rules.validate import TokenStreamValidator, ValidationError
 import logging
 import sys
 
@@ -17,3 +19,43 @@ RULE_3 = '''adam OR pridgen AND  ()   why AND not'''
 
 class TestParsing(TestCase):
 
+    def test_parse_string_types(self):
+        tokens = Parser.parse_string(RULE_1)
+        types = [t.TYPE for t in tokens if t.TYPE != SPACE]
+        self.assertEqual(types, [SYMBOL, OR, SYMBOL, ENTER_GROUP, SYMBOL, AND, SYMBOL, EXIT_GROUP])
+
+    def test_parse_string_offsets(self):
+        tokens = Parser.parse_string(RULE_0)
+        self.assertEqual([(t.offset, str(t)) for t in tokens],
+                         [(0, 'adam'), (4, ' '), (5, 'OR'), (7, ' '), (8, 'pridgen')])
+
+    def test_operator_needs_terminator(self):
+        tokens = Parser.parse_string('ORACLE AND(x)')
+        self.assertEqual([t.TYPE for t in tokens], [SYMBOL, SPACE, AND, ENTER_GROUP, SYMBOL, EXIT_GROUP])
+
+    def test_iter_chunks(self):
+        chunks = [RULE_1[i:i+3] for i in range(0, len(RULE_1), 3)]
+        expected = [(t.TYPE, t.offset, str(t)) for t in Parser.parse_string(RULE_1)]
+        streamed = [(t.TYPE, t.offset, str(t)) for t in Parser.iter_chunks(chunks)]
+        self.assertEqual(expected, streamed)
+
+    def test_validate_injects_implicit_and(self):
+        validator = TokenStreamValidator(Parser.parse_string(RULE_1))
+        self.assertTrue(validator.validate_without_symbols())
+        self.assertEqual([t.TYPE for t in validator.token_stream],
+                         [SYMBOL, OR, SYMBOL, AND, ENTER_GROUP, SYMBOL, AND, SYMBOL, EXIT_GROUP])
+        self.assertEqual(str(validator.main_group), 'adam OR pridgen AND (why AND not)')
+
+    def test_validate_unbalanced(self):
+        validator = TokenStreamValidator(Parser.parse_string(RULE_2_FAIL))
+        with self.assertRaises(ValidationError) as ctx:
+            validator.validate_without_symbols()
+        self.assertEqual(ctx.exception.offset, RULE_2_FAIL.index('('))
+        self.assertEqual(ctx.exception.expected, {EXIT_GROUP})
+
+    def test_validate_unexpected_token(self):
+        validator = TokenStreamValidator(Parser.parse_string('adam AND OR pridgen'))
+        with self.assertRaises(ValidationError) as ctx:
+            validator.validate_without_symbols()
+        self.assertEqual(ctx.exception.offset, 9)
+        self.assertEqual(ctx.exception.expected, set(AND_NEXT))
@@ -0,0 +1,519 @@
+from unittest import TestCase
+import asyncio
+import gc
+import itertools
+import regex
+from collections.abc import Iterable, Mapping, Sequence, Sized
+from simple_rules.async_engine import AsyncRuleEngine
+from simple_rules.consts import PREDICATE
+from simple_rules.process import Rule
+from simple_rules.actions import ActionBaseClass, EvaluationContext
+from simple_rules.metrics import RuleMetrics
+from simple_rules.regex import RegexMatch
+from simple_rules.ruleset import RuleSet
+from simple_rules.pipeline import RulePipeline
+from simple_rules.config import Config
+from simple_rules.fields import FieldPath, MISSING
+from simple_rules.prefilter import LiteralPrefilter, required_literal
+
+
+SYMBOLS = ['adam', 'pridgen', 'why', 'not']
+
+RULES = [
+    'adam OR pridgen',
+    'adam OR pridgen ( why AND not)',
+    'adam AND (pridgen OR why) AND not',
+    '(adam OR why) AND (pridgen OR not)',
+]
+
+INPUTS = ['adam', 'pridgen', 'why', 'not', 'nothing']
+
+
+class TestRule(TestCase):
+
+    def setUp(self):
+        self.sym_maps = {name: RegexMatch(name, '.*' + name) for name in SYMBOLS}
+
+    def test_compiled_matches_interpreted(self):
+        for rule_string in RULES:
+            rule = Rule.from_token_string('rule', rule_string, self.sym_maps)
+            for i in INPUTS:
+                self.assertEqual(bool(rule.execute(i)), bool(rule.interpret(i)), (rule_string, i))
+
+    def test_execute(self):
+        rule = Rule.from_token_string('rule', '(adam OR why) AND (pridgen OR not)', self.sym_maps)
+        self.assertTrue(rule.execute('adam pridgen'))
+        self.assertFalse(rule.execute('adam'))
+        self.assertFalse(rule.execute('pridgen'))
+
+    def test_missing_symbol(self):
+        self.assertIsNone(Rule.from_token_string('rule', 'adam OR unknown', self.sym_maps))
+
+
+class TestRuleSet(TestCase):
+
+    def setUp(self):
+        symbols = {name: '.*' + name for name in SYMBOLS}
+        symbols['double'] = r'(a)\1'
+        self.ruleset = RuleSet(symbols)
+        for pos, rule_string in enumerate(RULES):
+            self.ruleset.add_rule_string('rule_{}'.format(pos), rule_string)
+        self.ruleset.add_rule_string('double', 'double OR why')
+
+    def test_match_symbols(self):
+        bitmap = self.ruleset.match_symbols('aa adam not')
+        self.assertEqual(self.ruleset.symbol_names(bitmap), ['adam', 'not', 'double'])
+
+    def test_matches_individual_rules(self):
+        for i in INPUTS + ['aa', 'adam pridgen']:
+            expected = [rule.name for rule in self.ruleset.rules if rule.execute(i)]
+            self.assertEqual(self.ruleset.execute(i), expected, i)
+
+
+class TestEvaluationContext(TestCase):
+
+    def test_shared_symbols_run_once(self):
+        sym_maps = {name: RegexMatch(name, '.*' + name) for name in SYMBOLS}
+        rules = [Rule.from_token_string('rule', r, sym_maps) for r in ['adam AND why', 'adam AND not', '(adam) OR why']]
+        context = EvaluationContext()
+        results = [bool(rule.execute('adam why', context)) for rule in rules]
+        self.assertEqual(results, [True, False, True])
+        self.assertEqual(context.stats(), {'hits': 2, 'misses': 3})
+
+        rules[0].execute('not adam', context)
+        self.assertEqual(context.stats(), {'hits': 2, 'misses': 5})
+
+    def test_reset_for_reused_buffer(self):
+        rule = Rule.from_token_string('rule', 'adam', {'adam': RegexMatch('adam', '.*adam')})
+        context = EvaluationContext()
+        buffer = bytearray(b'adam')
+        self.assertTrue(rule.execute(buffer, context))
+        buffer[:] = b'nope'
+        # the same object is the same input until the context is reset
+        self.assertTrue(rule.execute(buffer, context))
+        context.reset(buffer)
+        self.assertFalse(rule.execute(buffer, context))
+        self.assertFalse(rule.execute(buffer, EvaluationContext()))
+
+
+class TestReorder(TestCase):
+
+    def test_reorder_and_group(self):
+        sym_maps = {
+            'slow': RegexMatch('slow', '(?:a|b)*c'),
+            'rare': RegexMatch('rare', 'rare'),
+        }
+        rule = Rule.from_token_string('rule', 'slow AND rare', sym_maps)
+        rule.enable_profiling()
+        inputs = ['ab' * 50, 'rare', 'abc']
+        expected = [bool(rule.execute(i)) for i in inputs * 20]
+
+        self.assertEqual(rule.reorder(), 1)
+        self.assertIs(rule.predicates[rule.main_predicate][0], sym_maps['rare'])
+        self.assertEqual([bool(rule.execute(i)) for i in inputs * 20], expected)
+
+    def test_mixed_group_untouched(self):
+        sym_maps = {name: RegexMatch(name, name) for name in SYMBOLS}
+        rule = Rule.from_token_string('rule', 'pridgen AND adam OR why', sym_maps)
+        rule.enable_profiling()
+        for i in INPUTS:
+            rule.execute(i)
+        members = list(rule.predicates[rule.main_predicate])
+        self.assertEqual(rule.reorder(), 0)
+        self.assertEqual(list(rule.predicates[rule.main_predicate]), members)
+
+
+class TestExecuteMany(TestCase):
+
+    def setUp(self):
+        sym_maps = {name: RegexMatch(name, '.*' + name) for name in SYMBOLS}
+        self.rule = Rule.from_token_string('rule', RULES[1], sym_maps)
+        self.inputs = INPUTS * 50
+
+    def test_backends_keep_order(self):
+        expected = [bool(self.rule.execute(i)) for i in self.inputs]
+        for backend in ['thread', 'process']:
+            results = list(self.rule.execute_many(self.inputs, workers=2, backend=backend, chunk_size=7))
+            self.assertEqual(results, expected, backend)
+
+    def test_serial_is_lazy(self):
+        results = itertools.islice(self.rule.execute_many(itertools.repeat('adam'), workers=1), 3)
+        self.assertEqual([bool(r) for r in results], [True] * 3)
+
+    def test_unordered(self):
+        expected = [bool(self.rule.execute(i)) for i in self.inputs]
+        results = dict(self.rule.execute_many(self.inputs, workers=3, backend='thread', chunk_size=5, ordered=False))
+        self.assertEqual([results[pos] for pos in range(len(self.inputs))], expected)
+
+    def test_ruleset_process_backend(self):
+        ruleset = RuleSet({name: '.*' + name for name in SYMBOLS})
+        for pos, rule_string in enumerate(RULES):
+            ruleset.add_rule_string('rule_{}'.format(pos), rule_string)
+        expected = [ruleset.execute(i) for i in self.inputs]
+        self.assertEqual(list(ruleset.execute_many(self.inputs, workers=2, chunk_size=9)), expected)
+
+
+class TestPrefilter(TestCase):
+
+    def test_required_literal(self):
+        self.assertEqual(required_literal('.*adam'), 'adam')
+        self.assertEqual(required_literal(r'\d+ GET /index'), ' GET /index')
+        self.assertIsNone(required_literal('(?i)adam'))
+        self.assertIsNone(required_literal('adam|pridgen'))
+        self.assertIsNone(required_literal('(?:adam){e<=1}'))
+        self.assertEqual(required_literal('[]a]foo'), 'foo')
+
+    def test_regex_only_sets(self):
+        for pattern, input in [('[[:alpha:]]foo', 'afoo'), ('[[a-z]--[aeiou]]bar', 'bbar'),
+                               ('(?V1)[[a-z]--[aeiou]]bar', 'bbar'), ('[^[:digit:]]baz', 'xbaz')]:
+            self.assertIsNone(required_literal(pattern), pattern)
+            self.assertEqual(bool(RegexMatch('n', pattern).match(input)), bool(regex.match(pattern, input)), pattern)
+        self.assertTrue(RegexMatch('n', '[[:alpha:]]foo').match('afoo'))
+
+    def test_prefix_literals(self):
+        prefilter = LiteralPrefilter([('ab', 1), ('abc', 2), ('bc', 3), ('zz', 4)])
+        self.assertEqual(sorted(prefilter.candidates('xabcx')), [1, 2, 3])
+        self.assertEqual(prefilter.stats()['rejects'], 1)
+
+    def test_ruleset_prefilter(self):
+        symbols = {name: '.*' + name for name in SYMBOLS}
+        symbols['any'] = '.'
+        plain = RuleSet(symbols)
+        filtered = RuleSet(symbols, prefilter=True)
+        for pos, rule_string in enumerate(RULES + ['any AND not']):
+            plain.add_rule_string('rule_{}'.format(pos), rule_string)
+            filtered.add_rule_string('rule_{}'.format(pos), rule_string)
+        for i in INPUTS + ['adam pridgen', 'not adam']:
+            self.assertEqual(filtered.execute(i), plain.execute(i), i)
+        self.assertGreater(filtered.prefilter.stats()['reject_rate'], 0.5)
+
+
+class TestAsyncRuleEngine(TestCase):
+
+    def test_stream(self):
+        sym_maps = {name: RegexMatch(name, '.*' + name) for name in SYMBOLS}
+        rules = [Rule.from_token_string('rule_{}'.format(pos), r, sym_maps) for pos, r in enumerate(RULES)]
+        engine = AsyncRuleEngine(rules, concurrency=3, queue_size=2, slow_rules=['rule_1'])
+        self.assertEqual([rule.name for rule in engine.offload_rules], ['rule_1'])
+
+        async def inputs():
+            for i in INPUTS * 4:
+                yield i
+
+        async def collect():
+            return [item async for item in engine.stream(inputs())]
+
+        expected = [(i, [rule.name for rule in rules if rule.execute(i)]) for i in INPUTS * 4]
+        self.assertEqual(asyncio.run(collect()), expected)
+
+
+class TestActionDispatch(TestCase):
+
+    def test_subclass_dispatch(self):
+        class Text(str):
+            pass
+
+        action = RegexMatch('adam', 'adam')
+        self.assertTrue(action.match(Text('adam')))
+        self.assertIs(action.dispatch_cache[Text], action.match_mapping[str])
+
+    def test_register_invalidates_cache(self):
+        action = ActionBaseClass()
+        self.assertFalse(action.match(['adam']))
+        action.register_class(Sequence, lambda obj: len(obj) == 1)
+        self.assertTrue(action.match(['adam']))
+        action.register_class(list, lambda obj: 'list')
+        self.assertEqual(action.match(['adam']), 'list')
+
+    def test_most_specific_abc(self):
+        action = ActionBaseClass()
+        action.register_class(Iterable, lambda obj: 'iterable')
+        action.register_class(Mapping, lambda obj: 'mapping')
+        action.register_class(object, lambda obj: 'object')
+        self.assertEqual(action.match({'a': 1}), 'mapping')
+        self.assertEqual(action.match(['a']), 'iterable')
+        self.assertEqual(action.match(1), 'object')
+        action.register_class(Sized, lambda obj: 'sized')
+        self.assertEqual(action.match({'a': 1}), 'mapping')
+        with self.assertRaises(Exception):
+            action.match(['a'])
+
+
+class TestRuleMetrics(TestCase):
+
+    def setUp(self):
+        self.sym_maps = {name: RegexMatch(name, '.*' + name) for name in SYMBOLS}
+        self.rule = Rule.from_token_string('rule', 'adam OR (pridgen AND why) OR why', self.sym_maps)
+        self.metrics = RuleMetrics()
+        self.metrics.attach([self.rule])
+        for i in ['adam', 'pridgen', 'pridgen why', 'nothing']:
+            self.rule.execute(i)
+        self.main = self.rule.main_predicate
+        self.child = [k for k in self.rule.predicates if k != self.main][0]
+
+    def test_snapshot(self):
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['rules']['rule']['calls'], 4)
+        self.assertEqual(snapshot['rules']['rule']['true'], 2)
+        self.assertEqual(snapshot['actions']['adam']['calls'], 4)
+        self.assertEqual(snapshot['group_skips']['rule'], {self.main: 3, self.child: 1})
+        self.assertEqual(sum(snapshot['rules']['rule']['buckets'].values()), 4)
+
+    def test_prometheus_and_reset(self):
+        text = self.metrics.to_prometheus()
+        self.assertIn('simple_rules_rule_calls_total{rule="rule"} 4', text)
+        self.assertIn('simple_rules_rule_latency_seconds_bucket{rule="rule",le="+Inf"} 4', text)
+        self.assertIn('simple_rules_group_skipped_operands_total{{rule="rule",group="{}"}} 3'.format(self.main), text)
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot()['rules']['rule']['calls'], 0)
+        self.assertEqual(self.metrics.snapshot()['group_skips']['rule'], {self.main: 0, self.child: 0})
+
+    def test_detach(self):
+        self.metrics.detach([self.rule])
+        self.rule.execute('adam')
+        self.assertEqual(self.metrics.snapshot()['rules']['rule']['calls'], 4)
+        self.assertIsNone(self.sym_maps['adam'].metrics_profile)
+
+    def test_detach_keeps_shared_actions(self):
+        other = Rule.from_token_string('other', 'adam AND why', self.sym_maps)
+        self.metrics.attach([other])
+        self.metrics.detach([self.rule])
+        other.execute('adam')
+        self.assertEqual(self.metrics.snapshot()['actions']['adam']['calls'], 5)
+        self.assertIsNone(self.sym_maps['pridgen'].metrics_profile)
+        self.metrics.detach([other])
+        self.assertIsNone(self.sym_maps['adam'].metrics_profile)
+
+    def test_reorder_profiling_untouched(self):
+        other = Rule.from_token_string('other', 'adam AND why', self.sym_maps)
+        profile = self.sym_maps['why'].enable_profiling()
+        self.metrics.attach([other])
+        before = self.metrics.snapshot()['actions']['why']['calls']
+        other.execute('adam why')
+        self.metrics.detach([other, self.rule])
+        self.assertIs(self.sym_maps['why'].profile, profile)
+        self.assertEqual(profile.calls, 1)
+        self.assertEqual(self.metrics.snapshot()['actions']['why']['calls'], before + 1)
+
+
+class TestSharedPredicates(TestCase):
+
+    def setUp(self):
+        self.sym_maps = {name: RegexMatch(name, '.*' + name) for name in SYMBOLS}
+
+    def test_common_groups_are_shared(self):
+        first = Rule.from_token_string('first', 'adam AND (pridgen OR why)', self.sym_maps)
+        second = Rule.from_token_string('second', 'not OR (pridgen OR why)', self.sym_maps)
+        shared = first.predicates[first.main_predicate][2]
+        self.assertIs(second.predicates[second.main_predicate][2], shared)
+        self.assertIs(first.predicates[shared.num], second.predicates[shared.num])
+        self.assertGreater(shared.users, 1)
+        self.assertIsNot(first.main_predicate, second.main_predicate)
+
+    def test_users_count_live_rules(self):
+        first = Rule.from_token_string('first', 'adam AND (pridgen OR not)', self.sym_maps)
+        shared = first.predicates[first.main_predicate][2]
+        self.assertEqual(shared.users, 1)
+        for _ in range(3):
+            second = Rule.from_token_string('second', 'why OR (pridgen OR not)', self.sym_maps)
+            self.assertEqual(shared.users, 2)
+            del second
+            gc.collect()
+            self.assertEqual(shared.users, 1)
+        # a group no other live rule holds is no longer cached as shared
+        state = EvaluationContext()
+        first.compile()
+        first.execute('adam pridgen', state)
+        self.assertNotIn((PREDICATE, shared.num), state.results)
+
+    def test_shared_group_evaluated_once(self):
+        first = Rule.from_token_string('first', 'not AND (pridgen OR why)', self.sym_maps)
+        second = Rule.from_token_string('second', 'adam OR (pridgen OR why)', self.sym_maps)
+        group_key = second.predicates[second.main_predicate][2].num
+        state = EvaluationContext()
+        self.assertEqual(second.execute('not pridgen', state), first.execute('not pridgen', state))
+        # second fills the group, first reuses it: adam, group, pridgen, not
+        self.assertEqual(state.stats(), {'hits': 1, 'misses': 4})
+        self.assertIn((PREDICATE, group_key), state.results)
+
+    def test_tokens_are_slim(self):
+        first = Rule.from_token_string('first', 'adam AND why', self.sym_maps)
+        second = Rule.from_token_string('second', 'why AND not', self.sym_maps)
+        operator = first.predicates[first.main_predicate][1]
+        self.assertIs(second.predicates[second.main_predicate][1], operator)
+        self.assertFalse(hasattr(operator, '__dict__'))
+
+
+class TestRulePipeline(TestCase):
+
+    def setUp(self):
+        symbols = {name: '.*' + name for name in SYMBOLS}
+        ignore_rules = RuleSet(symbols)
+        ignore_rules.add_rule_string('pridgen-not', 'pridgen AND not')
+        match_rules = RuleSet(symbols)
+        match_rules.add_rule_string('name', 'adam OR pridgen')
+        self.pipeline = RulePipeline({'health': 'GET /health', 'ping': r'(ping)\1'}, ignore_rules, match_rules)
+
+    def test_stages(self):
+        inputs = ['GET /health adam', 'pingping adam', 'pridgen not', 'adam', 'why']
+        self.assertEqual([self.pipeline.execute(i) for i in inputs], [[], [], [], ['name'], []])
+        stats = self.pipeline.stats()
+        self.assertEqual(stats['ignore-patterns']['inputs'], 5)
+        self.assertEqual(stats['ignore-patterns']['drops'], 2)
+        self.assertEqual(stats['ignore-chain']['drops'], 1)
+        self.assertEqual(stats['match-chain']['inputs'], 2)
+        self.assertEqual(stats['match-chain']['drops'], 1)
+        self.assertGreater(stats['match-chain']['time'], 0.0)
+        self.pipeline.reset()
+        self.assertEqual(self.pipeline.stats()['ignore-patterns']['inputs'], 0)
+
+    def test_shared_bitmap(self):
+        self.assertTrue(self.pipeline.shared_symbols)
+        calls = []
+        for ruleset in [self.pipeline.ignore_rules, self.pipeline.match_rules]:
+            match_symbols = ruleset.match_symbols
+            ruleset.match_symbols = lambda input, match_symbols=match_symbols: calls.append(input) or match_symbols(input)
+        self.assertEqual(self.pipeline.execute('adam'), ['name'])
+        self.assertEqual(calls, ['adam'])
+
+    def test_stats_workers(self):
+        inputs = ['GET /health adam', 'pingping adam', 'pridgen not', 'adam', 'why'] * 40
+        expected = [self.pipeline.execute(i) for i in inputs]
+        serial = self.pipeline.stats()
+        for backend in ['thread', 'process']:
+            self.pipeline.reset()
+            self.assertEqual(list(self.pipeline.execute_many(inputs, workers=2, backend=backend, chunk_size=7)),
+                             expected)
+            stats = self.pipeline.stats()
+            for stage in serial:
+                self.assertEqual(stats[stage]['inputs'], serial[stage]['inputs'], (backend, stage))
+                self.assertEqual(stats[stage]['drops'], serial[stage]['drops'], (backend, stage))
+
+    def test_ignore_bytes(self):
+        pipeline = RulePipeline({'word': r'\w+$', 'raw': {'pattern': 'GET /health', 'target': 'bytes'}},
+                                None, self.pipeline.match_rules)
+        self.assertTrue(pipeline.ignored('café'.encode('utf8')))
+        self.assertTrue(pipeline.ignored(memoryview(b'GET /health adam')))
+        self.assertEqual(pipeline.execute(memoryview(b'adam!')), ['name'])
+
+    def test_from_config(self):
+        Config.from_json({'simple-rules': {
+            'regular-expressions': {name: '.*' + name for name in SYMBOLS},
+            'ignore-regular-expressions': {'health': '.*health'},
+            'match-chain': {'name': 'adam OR pridgen'},
+        }})
+        pipeline = RulePipeline.from_config()
+        self.assertIsNone(pipeline.ignore_rules)
+        self.assertEqual(list(pipeline.execute_many(['adam', 'adam health'], workers=2, backend='thread')),
+                         [['name'], []])
+
+
+class Record(dict):
+
+    def __str__(self):
+        raise AssertionError('record serialized')
+
+    __repr__ = __str__
+
+
+class TestFieldPaths(TestCase):
+
+    def setUp(self):
+        self.record = Record({'http': {'request': {'uri': '/admin/login', 'headers': [{'host': 'example'}]}}})
+
+    def test_field_path(self):
+        self.assertEqual(FieldPath('http.request.uri').get(self.record), '/admin/login')
+        self.assertEqual(FieldPath('http.request.headers.0.host').get(self.record), 'example')
+        self.assertIs(FieldPath('http.response.status').get(self.record), MISSING)
+        self.assertIs(FieldPath('http.request.uri.path').get(self.record), MISSING)
+        self.assertIs(FieldPath('http.request.headers.3').get(self.record), MISSING)
+
+    def test_regex_field(self):
+        action = RegexMatch.from_config('admin', {'pattern': '/admin', 'field': 'http.request.uri'})
+        self.assertTrue(action.match(self.record))
+        self.assertFalse(action.match(Record({'http': {}})))
+        self.assertTrue(action.match('/admin'))
+        self.assertEqual(action.config_spec(), {'pattern': '/admin', 'field': 'http.request.uri'})
+
+    def test_ruleset_fields(self):
+        ruleset = RuleSet({
+            'admin': {'pattern': '/admin', 'field': 'http.request.uri'},
+            'host': {'pattern': 'example', 'field': 'http.request.headers.0.host'},
+        })
+        ruleset.add_rule_string('admin-host', 'admin AND host')
+        ruleset.add_rule_string('admin', 'admin')
+        self.assertEqual(ruleset.execute(self.record), ['admin-host', 'admin'])
+        self.assertEqual(ruleset.execute(Record({'http': {'request': {'uri': '/'}}})), [])
+
+
+class TestBytesMatching(TestCase):
+
+    def test_regex_bytes(self):
+        action = RegexMatch('adam', '.*adam')
+        self.assertIsNone(action.bytes_regex)
+        for data in [b'x adam', bytearray(b'x adam'), memoryview(b'x adam')]:
+            self.assertEqual(action.match(data).group(), 'x adam')
+        self.assertFalse(action.match(b'nobody'))
+
+    def test_text_target_decodes(self):
+        action = RegexMatch('word', r'\w+$')
+        self.assertTrue(action.match('café'))
+        for data in ['café'.encode('utf8'), memoryview('café'.encode('utf8'))]:
+            self.assertTrue(action.match(data))
+        self.assertTrue(RegexMatch('accent', '[é]x').match('éx'.encode('utf8')))
+        ruleset = RuleSet({'word': r'\w+$'})
+        ruleset.add_rule_string('word', 'word')
+        self.assertEqual(ruleset.execute('café'.encode('utf8')), ruleset.execute('café'))
+
+    def test_bytes_target(self):
+        action = RegexMatch('word', r'\w+$', target='bytes')
+        self.assertFalse(action.match('café'.encode('utf8')))
+        self.assertTrue(action.match(b'cafe'))
+        action = RegexMatch('adam', '.*adam', target='bytes')
+        self.assertEqual(action.match(memoryview(b'x adam')).group(), b'x adam')
+        self.assertFalse(action.match(memoryview(b'x adxm')))
+        self.assertEqual(action.bytes_literal, b'adam')
+
+    def test_bytes_target_falls_back_to_text(self):
+        cases = [('(?u)abc', 'abc'), ('caf\\xe9', 'café'), (r'caf\N{LATIN SMALL LETTER E WITH ACUTE}', 'café'),
+                 ('[é]x', 'éx'), (r'\u00e9x', 'éx')]
+        for pattern, text in cases:
+            action = RegexMatch(pattern, pattern, target='bytes')
+            self.assertIsNone(action.bytes_regex, pattern)
+            self.assertIsNone(action.bytes_literal, pattern)
+            for data in [text.encode('utf8'), memoryview(text.encode('utf8'))]:
+                self.assertTrue(action.match(data), pattern)
+            self.assertFalse(action.match(b'\xc3x'), pattern)
+        self.assertIsNotNone(RegexMatch('escaped', r'caf\\xe9', target='bytes').bytes_regex)
+        ruleset = RuleSet({'accent': {'pattern': '[é]x', 'target': 'bytes'}, 'adam': {'pattern': '.*adam', 'target': 'bytes'}},
+                          prefilter=True)
+        ruleset.add_rule_string('both', 'accent AND adam')
+        self.assertEqual(ruleset.execute(memoryview('éx adam'.encode('utf8'))), ['both'])
+
+    def test_target(self):
+        action = RegexMatch.from_config('adam', {'pattern': '.*adam', 'target': 'bytes'})
+        self.assertIsNotNone(action.bytes_regex)
+        self.assertEqual(action.config_spec(), {'pattern': '.*adam', 'target': 'bytes'})
+        with self.assertRaises(Exception):
+            RegexMatch.from_config('adam', {'pattern': '.*adam', 'target': 'words'})
+
+    def test_ruleset_bytes(self):
+        for prefilter in [False, True]:
+            ruleset = RuleSet({name: '.*' + name for name in SYMBOLS}, prefilter=prefilter)
+            for rule in RULES:
+                ruleset.add_rule_string(rule, rule)
+            for i in INPUTS:
+                self.assertEqual(ruleset.execute(memoryview(i.encode('utf8'))), ruleset.execute(i), i)
+
+    def test_ruleset_mixed_targets(self):
+        symbols = {'adam': {'pattern': '.*adam', 'target': 'bytes'}, 'word': r'.*\bcafé\b', 'bare': r'.*\s\w+$'}
+        for prefilter in [False, True]:
+            ruleset = RuleSet(symbols, prefilter=prefilter)
+            for rule in ['adam AND word', 'bare', 'adam']:
+                ruleset.add_rule_string(rule, rule)
+            data = 'adam café'.encode('utf8')
+            for i in [data, bytearray(data), memoryview(data)]:
+                self.assertEqual(ruleset.execute(i), ['adam AND word', 'bare', 'adam'])
+            self.assertEqual(ruleset.execute(memoryview(b'adxm cafe')), ['bare'])
+            if prefilter:
+                self.assertGreater(ruleset.bytes_matcher.prefilter.stats()['inputs'], 0)
@@ -0,0 +1,90 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from simple_rules.consts import *
+from simple_rules.hot_reload import RuleReloader
+
+
+CONFIG = '''
+[simple-rules.regular-expressions]
+adam = ".*adam"
+pridgen = ".*pridgen"
+why = ".*why"
+
+[simple-rules.match-chain]
+name = "adam OR pridgen"
+question = "adam AND why"
+'''
+
+
+class TestRuleReloader(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_path = os.path.join(self.directory, 'rules.toml')
+        self.write(CONFIG)
+        self.reloader = RuleReloader(self.config_path)
+
+    def tearDown(self):
+        self.reloader.stop()
+        shutil.rmtree(self.directory)
+
+    def write(self, content):
+        with open(self.config_path, 'w') as config_file:
+            config_file.write(content)
+        # make the change visible to the mtime check on coarse clocks
+        stat = os.stat(self.config_path)
+        os.utime(self.config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_initial_snapshot(self):
+        self.assertEqual(self.reloader.execute('adam why'), ['name', 'question'])
+        self.assertEqual(self.reloader.execute('pridgen'), ['name'])
+        self.assertFalse(self.reloader.check())
+
+    def test_only_changes_are_recompiled(self):
+        old = self.reloader.snapshot
+        self.write(CONFIG.replace('why = ".*why"', 'why = ".*how"') + 'other = "pridgen"\n')
+        self.assertTrue(self.reloader.check())
+        new = self.reloader.snapshot
+
+        self.assertEqual(new.changes['symbols'], ['why'])
+        self.assertEqual(new.changes['changed'], [(MATCH_CHAIN, 'question')])
+        self.assertEqual(new.changes['added'], [(MATCH_CHAIN, 'other')])
+        self.assertEqual(new.changes['reused'], 1)
+        self.assertIs(dict(new.chains[MATCH_CHAIN])['name'], dict(old.chains[MATCH_CHAIN])['name'])
+        self.assertIs(new.sym_maps['adam'], old.sym_maps['adam'])
+
+        # the old snapshot still answers with the old config
+        self.assertEqual(old.execute('adam why'), ['name', 'question'])
+        self.assertEqual(new.execute('adam why'), ['name'])
+        self.assertEqual(new.execute('adam how pridgen'), ['name', 'question', 'other'])
+
+    def test_table_symbols_are_reused(self):
+        config = CONFIG.replace('adam = ".*adam"', 'adam = { pattern = ".*adam" }').replace(
+            'why = ".*why"', 'why = { pattern = ".*why", target = "text" }')
+        self.write(config)
+        self.assertTrue(self.reloader.check())
+        old = self.reloader.snapshot
+        self.write(config + 'other = "pridgen"\n')
+        self.assertTrue(self.reloader.check())
+        new = self.reloader.snapshot
+        self.assertEqual(new.changes['symbols'], [])
+        self.assertEqual(new.changes['changed'], [])
+        self.assertEqual(new.changes['added'], [(MATCH_CHAIN, 'other')])
+        self.assertIs(new.sym_maps['adam'], old.sym_maps['adam'])
+        self.assertIs(new.sym_maps['why'], old.sym_maps['why'])
+
+    def test_removed_rule(self):
+        self.write(CONFIG.replace('question = "adam AND why"\n', ''))
+        self.assertTrue(self.reloader.check())
+        self.assertEqual(self.reloader.snapshot.changes['removed'], [(MATCH_CHAIN, 'question')])
+        self.assertEqual(self.reloader.execute('adam why'), ['name'])
+
+    def test_bad_config_keeps_snapshot(self):
+        old = self.reloader.snapshot
+        self.write(CONFIG + 'broken = "adam AND missing"\n')
+        with self.assertRaises(Exception):
+            self.reloader.check()
+        self.assertIs(self.reloader.snapshot, old)
@@ -0,0 +1,76 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from simple_rules.scan import chunk_offsets, map_file, scan_chunk, scan_files
+from simple_rules.ruleset import RuleSet
+
+
+LINES = [
+    'adam wrote this',
+    'pridgen wrote that',
+    'nobody wrote here',
+    'adam pridgen wrote both',
+]
+
+
+class FailingEngine(object):
+    targets_bytes = False
+
+    def execute(self, input):
+        raise KeyError(input)
+
+
+class TestScan(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'input.log')
+        with open(self.path, 'w') as f:
+            f.write("\r\n".join(LINES * 3))
+        self.ruleset = RuleSet({'adam': '.*adam', 'pridgen': '.*pridgen', 'both': r'.*both\Z'})
+        self.ruleset.add_rule_string('name', 'adam OR pridgen')
+        self.ruleset.add_rule_string('both', 'both')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def expected(self):
+        result = []
+        offset = 0
+        for line in LINES * 3:
+            for name in self.ruleset.execute(line):
+                result.append((self.path, offset, name))
+            offset += len(line) + 2
+        return result
+
+    def test_chunks_end_on_lines(self):
+        mm = map_file(self.path)
+        offsets = chunk_offsets(mm, 10)
+        self.assertEqual(offsets[0][0], 0)
+        self.assertEqual(offsets[-1][1], len(mm))
+        for _, end in offsets[:-1]:
+            self.assertEqual(mm[end - 1:end], b'\n')
+        mm.close()
+
+    def test_engine_error_propagates(self):
+        for targets_bytes in [False, True]:
+            engine = FailingEngine()
+            engine.targets_bytes = targets_bytes
+            with self.assertRaises(KeyError):
+                scan_chunk(self.path, 0, os.path.getsize(self.path), engine)
+
+    def test_scan_serial(self):
+        self.assertEqual(list(scan_files([self.path], self.ruleset, chunk_size=16)), self.expected())
+
+    def test_scan_workers(self):
+        self.assertEqual(list(scan_files([self.path], self.ruleset, workers=2, chunk_size=16)), self.expected())
+
+    def test_scan_bytes_target(self):
+        symbols = {name: {'pattern': pattern, 'target': 'bytes'} for name, pattern in self.ruleset.symbols.items()}
+        ruleset = RuleSet(symbols)
+        ruleset.add_rule_string('name', 'adam OR pridgen')
+        ruleset.add_rule_string('both', 'both')
+        self.assertTrue(ruleset.targets_bytes)
+        self.assertEqual(list(scan_files([self.path], ruleset, chunk_size=16)), self.expected())
@@ -0,0 +1,199 @@
+from unittest import TestCase
+import jellyfish
+import json
+import os
+import random
+import tempfile
+import numpy as np
+
+from simple_rules.contrib import levenshtein
+from simple_rules.similarity import FuzzyWordIndex
+from simple_rules.vectors import BaseVectorOp, FlippyWordsVectors, SimpleWordVector
+
+
+WORDS = ['adam', 'pridgen', 'rule', '', 'madam']
+
+
+class TestBaseVectorOp(TestCase):
+
+    def test_count_matrix_matches_loop(self):
+        letters = sorted(BaseVectorOp.union(WORDS))
+        matrix = BaseVectorOp.build_vectors(WORDS, letters)
+        self.assertEqual(matrix.shape, (len(WORDS), len(letters)))
+        for word, row in zip(WORDS, matrix):
+            self.assertEqual(list(row), [word.count(l) for l in letters])
+
+    def test_lone_surrogates(self):
+        words = [b'ad\xffam'.decode('utf8', 'surrogateescape'), 'adam']
+        letters = sorted(BaseVectorOp.union(words))
+        matrix = BaseVectorOp.build_vectors(words, letters)
+        for word, row in zip(words, matrix):
+            self.assertEqual(list(row), list(BaseVectorOp.build_vector(word, letters)[1]))
+        cosine = BaseVectorOp.cosine_similarity_matrix(words, words)
+        self.assertAlmostEqual(cosine[0, 1], BaseVectorOp.cosine_similarity_from_string(words[0], words[1]))
+
+    def test_letter_order_and_unknown_letters(self):
+        letters, vector = BaseVectorOp.build_vector('madam', ['m', 'a', 'z'])
+        self.assertEqual(letters, ['m', 'a', 'z'])
+        self.assertEqual(list(vector), [2, 2, 0])
+
+    def test_shared_alphabet(self):
+        letters, matrix = BaseVectorOp.build_count_matrix(['ab', 'bc'])
+        self.assertEqual(letters, ['a', 'b', 'c'])
+        self.assertTrue(np.array_equal(matrix, [[1, 1, 0], [0, 1, 1]]))
+
+    def test_substring_vectors(self):
+        vectors = BaseVectorOp.build_substring_vectors(['ada', 'dam'], ['a', 'd', 'm'])
+        self.assertTrue(np.array_equal(vectors, [[2, 1, 0], [1, 1, 1]]))
+
+    def test_similarity_matrices_match_pairwise(self):
+        targets = ['dam', 'rule', 'xyz']
+        cosine = BaseVectorOp.cosine_similarity_matrix(WORDS, targets, chunk_size=2)
+        jaccard = BaseVectorOp.jaccard_distance_matrix(WORDS, targets, chunk_size=2)
+        self.assertEqual(cosine.shape, (len(WORDS), len(targets)))
+        for i, word in enumerate(WORDS):
+            for t, target in enumerate(targets):
+                self.assertAlmostEqual(jaccard[i, t], BaseVectorOp.jaccard_distance(word, target))
+                if word:
+                    self.assertAlmostEqual(cosine[i, t], BaseVectorOp.cosine_similarity_from_string(word, target))
+
+    def test_top_k_per_target(self):
+        top = BaseVectorOp.top_k_per_target(WORDS, ['dam', 'rule'], 2, chunk_size=2)
+        self.assertEqual([i for i, _ in top[0]], [4, 0])
+        self.assertEqual(top[1][0][0], 2)
+        self.assertAlmostEqual(top[1][0][1], 1.0)
+
+
+class TestLevenshtein(TestCase):
+
+    def test_matches_jellyfish(self):
+        pairs = [('kitten', 'sitting'), ('', 'abc'), ('adam', 'madam'), ('a' * 70 + 'b', 'b' + 'a' * 70)]
+        for source, target in pairs:
+            self.assertEqual(levenshtein(source, target), jellyfish.levenshtein_distance(source, target))
+
+    def test_max_distance(self):
+        self.assertEqual(levenshtein('kitten', 'sitting', max_distance=2), 3)
+        self.assertEqual(levenshtein('kitten', 'sitting', max_distance=3), 3)
+        self.assertEqual(levenshtein('a' * 100, 'b' * 100, max_distance=2), 3)
+        self.assertTrue(BaseVectorOp.levenshtein_within('pridgen', 'pridgn', 2))
+        self.assertFalse(BaseVectorOp.levenshtein_within('pridgen', 'adam', 2))
+
+
+class TestFuzzyWordIndex(TestCase):
+
+    def test_within(self):
+        index = FuzzyWordIndex(WORDS + ['pridgin', 'rules', 'adamant'])
+        self.assertEqual(index.within('pridgen', 1), [('pridgen', 0), ('pridgin', 1)])
+        self.assertEqual(index.within('adm', 1), [('adam', 1)])
+        brute = sorted([(w, jellyfish.levenshtein_distance('rul', w)) for w in index.words
+                        if jellyfish.levenshtein_distance('rul', w) <= 2], key=lambda r: (r[1], r[0]))
+        self.assertEqual(index.within('rul', 2), brute)
+
+    def test_top_k_and_save(self):
+        index = FuzzyWordIndex(WORDS)
+        self.assertEqual(index.top_k('madame', 1)[0][0], 'madam')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'words.idx')
+            index.save(path)
+            loaded = FuzzyWordIndex.load(path)
+        self.assertEqual(loaded.within('adan', 1), index.within('adan', 1))
+        self.assertEqual(loaded.top_k('madame', 2), index.top_k('madame', 2))
+
+    def test_within_matches_brute_force(self):
+        rng = random.Random(3)
+        words = ["".join(rng.choice('abcd') for _ in range(rng.randint(1, 6))) for _ in range(300)]
+        index = FuzzyWordIndex(words)
+        for query in words[:40] + ['', 'abba', 'dddddd']:
+            for max_distance in [0, 1, 2]:
+                brute = sorted([(w, jellyfish.levenshtein_distance(query, w)) for w in set(words)
+                                if jellyfish.levenshtein_distance(query, w) <= max_distance], key=lambda r: (r[1], r[0]))
+                self.assertEqual(index.within(query, max_distance), brute, (query, max_distance))
+
+    def test_top_k_min_shared(self):
+        index = FuzzyWordIndex(['madam', 'adam', 'mxxxxx'])
+        self.assertNotIn('mxxxxx', [word for word, _ in index.top_k('madame', 3)])
+        self.assertIn('mxxxxx', [word for word, _ in index.top_k('madame', 3, min_shared=1)])
+
+    def test_index_is_json(self):
+        index = FuzzyWordIndex(WORDS + ['aaaa'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'words.idx')
+            index.save(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f)['words'], index.words)
+            loaded = FuzzyWordIndex.load(path)
+            with open(path, 'w') as f:
+                json.dump(['not', 'an', 'index'], f)
+            with self.assertRaises(Exception):
+                FuzzyWordIndex.load(path)
+        self.assertEqual(loaded.within('aaa', 1), index.within('aaa', 1))
+
+
+class TestFlippyWordsVectors(TestCase):
+
+    def test_lazy_candidates_are_distinct(self):
+        targets = ['ad', 'am', 'ad']
+        eager = FlippyWordsVectors(targets)
+        lazy = FlippyWordsVectors(targets, lazy=True)
+        candidates = list(lazy.iter_candidates('adam'))
+        self.assertEqual(len(candidates), len(set(candidates)))
+        self.assertEqual(set(candidates), set(eager.permuted_targets))
+
+    def test_threshold_prunes_permutations(self):
+        lazy = FlippyWordsVectors(list('abcdefghijkl'), lazy=True)
+        self.assertEqual(list(lazy.iter_candidates('zzz', threshold=0.5)), [])
+
+    def test_best_k(self):
+        targets = ['ad', 'am', 'x']
+        best = FlippyWordsVectors(targets, lazy=True).best_k('amadx', 2)
+        scores = sorted([BaseVectorOp.levenshtein_similarity(c, 'amadx')
+                         for c in set(FlippyWordsVectors(targets).permuted_targets)], reverse=True)
+        self.assertEqual([score for _, score in best], scores[:2])
+        self.assertEqual(best[0][0], 'amadx')
+
+    def test_best_k_distinct(self):
+        self.assertEqual(FlippyWordsVectors(['a', 'aaa'], lazy=True).best_k('bcaa', 3, 0.3),
+                         [('aaaa', 0.5), ('aaa', 0.5)])
+        rng = random.Random(5)
+        for _ in range(300):
+            targets = ["".join(rng.choice('ab') for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 4))]
+            input = "".join(rng.choice('abc') for _ in range(rng.randint(0, 6)))
+            k, threshold = rng.randint(1, 4), rng.choice([0.0, 0.3, 0.6])
+            scored = [(BaseVectorOp.levenshtein_similarity(c, input), c) for c in set(FlippyWordsVectors(targets).permuted_targets)]
+            brute = sorted([item for item in scored if item[0] >= threshold], reverse=True)[:k]
+            best = FlippyWordsVectors(targets, lazy=True).best_k(input, k, threshold)
+            self.assertEqual(best, [(c, score) for score, c in brute], (targets, input, k, threshold))
+
+    def test_lazy_ordered_word_vectors(self):
+        vectors = FlippyWordsVectors(['ad', 'am'], lazy=True).get_orderd_word_vectors('adam', threshold=0.9)
+        self.assertEqual([k for k, _ in vectors], ['adam', 'amad'])
+
+
+class TestWindowVectors(TestCase):
+
+    def test_substrings_include_last_window(self):
+        self.assertEqual(BaseVectorOp.build_substrings('adam', 2), ['ad', 'da', 'am'])
+
+    def test_window_vectors_match_substring_vectors(self):
+        letters = ['a', 'd', 'm', 'x']
+        windows = BaseVectorOp.build_window_vectors('madamxadam', 4, letters)
+        substrings = BaseVectorOp.build_substrings('madamxadam', 4)
+        self.assertTrue(np.array_equal(windows, BaseVectorOp.build_substring_vectors(substrings, letters)))
+        self.assertEqual(BaseVectorOp.build_window_vectors('ad', 4, letters).shape, (0, 4))
+
+    def test_best_window(self):
+        self.assertEqual(BaseVectorOp.best_window('the quick brown fox', 'brown')[0], 10)
+        vector = SimpleWordVector('the quick brown fox', 'brown')
+        for name, fn in [('cosine', BaseVectorOp.cosine_similarity_from_string), ('jaccard', BaseVectorOp.jaccard_distance)]:
+            expected = [fn(s, 'brown') for s in vector.substring]
+            self.assertTrue(np.allclose(vector.window_scores(name), expected), name)
+        self.assertEqual(vector.best_substring('jaccard')[1], 'brown')
+
+    def test_best_window_chunks(self):
+        text = 'the quick brown fox jumps over the lazy dog ' * 20 + 'brwon'
+        expected = BaseVectorOp.best_window(text, 'brwon', chunk_size=len(text))
+        for chunk_size in [1, 7, 64]:
+            for name in ['cosine', 'jaccard']:
+                self.assertEqual(BaseVectorOp.best_window(text, 'brwon', name, chunk_size=chunk_size),
+                                 BaseVectorOp.best_window(text, 'brwon', name, chunk_size=len(text)), name)
+        self.assertEqual(expected[0], 10)